@@ -3,21 +3,82 @@ from constants import (
     CHAT_INDEX_NAME,
     SUMMARY_NAMESPACE,
     DOCUMENT_NAMESPACE,
+    CONTENT_NAMESPACE,
+    CHANNEL_SUMMARY_NAMESPACE,
+    PERSONA_NAMESPACE,
     SUMMARY_THRESHOLD,
     DEFAULT_TOP_K,
+    MAX_EXPANDED_QUERIES,
+    RRF_K,
+    HOT_TIER_WINDOW,
+    HOT_TIER_SIZE,
+    CHANNEL_CENTROID_NAMESPACE,
+    CHANNEL_CENTROID_BATCH,
+    CHANNEL_CENTROID_MAX_USERS,
+    CHANNEL_ROUTING_TOP_N,
+    REINGEST_SUMMARY_THRESHOLD,
     
     # Assistant Constants
     MODEL_NAME,
+    FAST_MODEL_NAME,
     MAX_TOKENS,
     MAX_CONTEXT_TOKENS,
     MAX_CHUNK_TOKENS,
+    DOCUMENT_CHUNK_TOKENS,
+    DOCUMENT_CHUNK_OVERLAP_TOKENS,
     TEMPERATURE,
-    SIMILARITY_THRESHOLD,
-    TOP_K,
+    MAP_REDUCE_CONCURRENCY,
+    MAP_REDUCE_CACHE_SIZE,
+    COMPRESSED_CONTEXT_TOKENS,
+    EXTRACTIVE_MAX_RATIO,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_SIZE,
+    CHAT_DEADLINE_SECONDS,
+    DEADLINE_COMPLETION_RESERVE,
+    DEADLINE_FALLBACK_RESERVE,
+    DEADLINE_ROUTED_SHARE,
+    THREAD_MEMORY_TURNS,
+    THREAD_MEMORY_MAX_TURNS,
+    THREAD_MEMORY_TTL,
+    THREAD_MEMORY_SIZE,
+    THREAD_CONTEXT_REUSE_THRESHOLD,
+    ROLLING_SUMMARY_FETCH_LIMIT,
+    SUMMARIZE_BATCH_CONCURRENCY,
+    PERSONA_REFRESH_BATCH,
+    PERSONA_MAX_EXAMPLES,
+    VOICE_SESSION_TTL,
+    VOICE_SESSION_SIZE,
+    VOICE_SESSION_TURNS,
+    VOICE_DRIFT_THRESHOLD,
+    VOICE_WARM_WAIT,
+
+    # Twilio
+    TWILIO_API_BASE_URL,
+    TWILIO_TIMEOUT,
+    TWILIO_CONNECT_TIMEOUT,
+    TWILIO_MAX_CONNECTIONS,
+    
+    # Adaptive Retrieval
+    RETRIEVAL_DEFAULTS,
+    
+    # Model Routing
+    MODEL_TIERS,
+    MODEL_ROUTES,
+    
+    # OpenAI Governor
+    LLM_PRIORITIES,
+    LLM_MAX_CONCURRENCY,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_MAX_RETRIES,
     
     # Service URLs
     ASSISTANT_SERVICE_URL,
     
+    # Phone Constants
+    PHONE_NUMBER_PATTERN,
+    
     # Special User IDs
     ASSISTANT_BOT_USER_ID,
     
@@ -1,67 +1,96 @@
 import aiohttp
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
 import os
+import re
+import logging
 from dotenv import load_dotenv
+from constants import PHONE_NUMBER_PATTERN
 
 # Load environment variables
 load_dotenv()
 
 class PhoneServiceClient:
-    """Client for interacting with the phone service."""
-    
+    """Client for interacting with the phone service.
+
+    When the phone router is mounted in this process the client calls it
+    directly; HTTP is only used when PHONE_SERVICE_URL (or an explicit
+    base_url) points at a separately deployed phone service.
+    """
+
     def __init__(self, base_url: str = None):
-        # Use the assistant service URL since phone endpoints are in the same service
-        self.base_url = base_url or os.getenv("ASSISTANT_SERVICE_URL", "http://localhost:8000")
+        remote_url = base_url or os.getenv("PHONE_SERVICE_URL")
+        self.base_url = remote_url or os.getenv("ASSISTANT_SERVICE_URL", "http://localhost:8000")
+        self.remote = bool(remote_url)
         self.session = None
-        
+
     async def _ensure_session(self):
         if not self.session:
             self.session = aiohttp.ClientSession()
-    
+
     async def close(self):
         """Close the client session."""
         if self.session:
             await self.session.close()
             self.session = None
-    
-    async def extract_call_details(self, message: str, context: Optional[str] = None) -> Tuple[bool, Optional[Dict]]:
+
+    def _local_router(self):
+        """Return the co-located phone router module, if any."""
+        if self.remote:
+            return None
+        try:
+            from routers import phone
+            return phone
+        except ImportError:
+            return None
+
+    async def extract_call_details(self, message: str, context: Optional[Dict[str, Any]] = None) -> Tuple[bool, Optional[Dict]]:
         """Extract call details from a message."""
-        await self._ensure_session()
-        
-        print(f"Making request to {self.base_url}/phone/extract")  # Debug print
-        print(f"Request data: {{'message': {message}, 'context': {context}}}")  # Debug print
-        
+        # Most messages contain no phone number and never need the phone service
+        if not re.search(PHONE_NUMBER_PATTERN, message):
+            return False, None
+
         try:
-            async with self.session.post(
-                f"{self.base_url}/phone/extract",
-                json={
-                    "message": message,
-                    "context": context
-                }
-            ) as response:
-                print(f"Response status: {response.status}")  # Debug print
-                response_text = await response.text()
-                print(f"Response text: {response_text}")  # Debug print
-                
-                if response.status != 200:
-                    raise Exception(f"Failed to extract call details: {response_text}")
-                    
-                result = await response.json()
-                if not result["is_call_request"]:
-                    return False, None
-                    
-                return True, {
-                    "phone_number": result["phone_number"],
-                    "message": result["message"]
-                }
+            phone = self._local_router()
+            if phone:
+                result = await phone.extract_call_details(message=message, context=context)
+            else:
+                await self._ensure_session()
+                async with self.session.post(
+                    f"{self.base_url}/phone/extract",
+                    json={
+                        "message": message,
+                        "context": context
+                    }
+                ) as response:
+                    if response.status != 200:
+                        raise Exception(f"Failed to extract call details: {await response.text()}")
+                    result = await response.json()
+
+            if not result["is_call_request"]:
+                return False, None
+
+            return True, {
+                "phone_number": result["phone_number"],
+                "message": result["message"]
+            }
         except Exception as e:
-            print(f"Error in extract_call_details: {str(e)}")  # Debug print
+            logging.error(f"Error in extract_call_details: {str(e)}")
             raise
-    
+
     async def make_call(self, to_number: str, message: str, channel_id: str = None, user_id: str = None, thread_id: Optional[str] = None) -> Dict:
         """Make a phone call with a message."""
+        phone = self._local_router()
+        if phone:
+            call_response = await phone.initiate_call(
+                phone_number=to_number,
+                channel_id=channel_id,
+                user_id=user_id,
+                thread_id=thread_id,
+                message=message
+            )
+            return call_response.model_dump()
+
         await self._ensure_session()
-        
         async with self.session.post(
             f"{self.base_url}/phone/call",
             json={
@@ -76,11 +105,14 @@ class PhoneServiceClient:
                 error_detail = await response.text()
                 raise Exception(f"Failed to make call: {error_detail}")
             return await response.json()
-    
+
     async def get_call_status(self, call_sid: str) -> Dict:
         """Get the status of a call."""
+        phone = self._local_router()
+        if phone:
+            return await phone.twilio_manager.get_call_status(call_sid)
+
         await self._ensure_session()
-        
         async with self.session.get(
             f"{self.base_url}/phone/call/{call_sid}"
         ) as response:
@@ -88,15 +120,53 @@ class PhoneServiceClient:
                 error_detail = await response.text()
                 raise Exception(f"Failed to get call status: {error_detail}")
             return await response.json()
-    
+
+    async def report_call_status(
+        self,
+        call_sid: str,
+        call_status: Optional[str] = None,
+        recording_status: Optional[str] = None,
+        recording_url: Optional[str] = None,
+        channel_id: Optional[str] = None
+    ) -> Dict:
+        """Forward a Twilio status or recording callback to the call's lifecycle."""
+        phone = self._local_router()
+        if phone:
+            return await phone.handle_call_status(
+                call_sid=call_sid,
+                call_status=call_status,
+                recording_status=recording_status,
+                recording_url=recording_url,
+                channel_id=channel_id
+            )
+
+        await self._ensure_session()
+        async with self.session.post(
+            f"{self.base_url}/phone/call-status",
+            json={
+                "call_sid": call_sid,
+                "call_status": call_status,
+                "recording_status": recording_status,
+                "recording_url": recording_url,
+                "channel_id": channel_id
+            }
+        ) as response:
+            if response.status != 200:
+                error_detail = await response.text()
+                raise Exception(f"Failed to report call status: {error_detail}")
+            return await response.json()
+
     async def get_call_recording(self, call_sid: str) -> Dict:
         """Get the recording URL for a call."""
+        phone = self._local_router()
+        if phone:
+            return await phone.get_call_recording(call_sid)
+
         await self._ensure_session()
-        
         async with self.session.get(
             f"{self.base_url}/phone/recording/{call_sid}"
         ) as response:
             if response.status != 200:
                 error_detail = await response.text()
                 raise Exception(f"Failed to get call recording: {error_detail}")
-            return await response.json() 
\ No newline at end of file
+            return await response.json()
@@ -1,6 +1,6 @@
-from typing import List
+from typing import List, Optional
 import httpx
-from models import Message, RetrieveResponse
+from models import Message, RetrieveRequest, RetrieveResponse
 import asyncio
 from httpx import TimeoutException, ConnectError
 import os
@@ -11,10 +11,22 @@ load_dotenv()
 
 class VectorServiceClient:
     def __init__(self, base_url: str = None):
-        # Use the assistant service URL since vector endpoints are in the same service
-        self.base_url = base_url or os.getenv("ASSISTANT_SERVICE_URL", "http://localhost:8000")
+        # Vector endpoints are in the same service unless VECTOR_SERVICE_URL points elsewhere
+        remote_url = base_url or os.getenv("VECTOR_SERVICE_URL")
+        self.base_url = remote_url or os.getenv("ASSISTANT_SERVICE_URL", "http://localhost:8000")
+        self.remote = bool(remote_url)
         self.client = httpx.AsyncClient(timeout=10.0)  # Shorter timeout
         self.max_retries = 3
+
+    def _local_router(self):
+        """Return the co-located vector router module, if any."""
+        if self.remote:
+            return None
+        try:
+            from routers import vector
+            return vector
+        except ImportError:
+            return None
     
     async def close(self):
         await self.client.aclose()
@@ -44,8 +56,8 @@ class VectorServiceClient:
         user_id: str,
         channel_id: str,
         channel_type: str,
-        top_k: int = 5,
-        threshold: float = 0.2  # Lower default threshold
+        top_k: Optional[int] = None,  # None lets the service pick per channel type
+        threshold: Optional[float] = None
     ) -> List[Message]:
         """
         Retrieve messages similar to the query.
@@ -56,6 +68,18 @@ class VectorServiceClient:
         - Assistant channel: Use all messages both public and private context the user has access to
         """
         try:
+            vector = self._local_router()
+            if vector:
+                result = await vector.retrieve_similar_messages(RetrieveRequest(
+                    query=query,
+                    user_id=user_id,
+                    channel_id=channel_id,
+                    channel_type=channel_type,
+                    top_k=top_k,
+                    threshold=threshold
+                ))
+                return result.messages
+
             response = await self._make_request_with_retry(
                 "POST",
                 f"{self.base_url}/vector/retrieve",
@@ -2,21 +2,115 @@
 CHAT_INDEX_NAME = "chatgenius-messages"
 SUMMARY_NAMESPACE = "document_summaries"
 DOCUMENT_NAMESPACE = "documents"
+CONTENT_NAMESPACE = "content_hashes"  # Content-addressed embeddings and file summaries
+CHANNEL_SUMMARY_NAMESPACE = "channel_summaries"  # Rolling per-channel summaries
+PERSONA_NAMESPACE = "persona_digests"  # Per-user style digests
 SUMMARY_THRESHOLD = 0.2
 DEFAULT_TOP_K = 5
+MAX_EXPANDED_QUERIES = 3  # Analyzer search queries searched alongside the original query
+RRF_K = 60  # Reciprocal-rank fusion constant for multi-query results
+HOT_TIER_WINDOW = 259200  # Seconds of recent messages kept in the in-process hot index
+HOT_TIER_SIZE = 2000  # Messages kept in the hot index at most; 2000 x 3072 float32 is about 25 MB per worker
+CHANNEL_CENTROID_NAMESPACE = "channel_centroids"  # Mean message embedding per channel
+CHANNEL_CENTROID_BATCH = 10  # New messages in a channel before its stored centroid is updated
+CHANNEL_CENTROID_MAX_USERS = 400  # Most recent posters kept on a non-public centroid, within Pinecone's 40 KB metadata limit
+CHANNEL_ROUTING_TOP_N = 5  # Channels searched per assistant-channel query
+REINGEST_SUMMARY_THRESHOLD = 0.2  # Fraction of changed chunks that triggers a new document summary
 
 # Assistant Constants
 MODEL_NAME = "gpt-4-turbo-preview"
+FAST_MODEL_NAME = "gpt-4o-mini"  # Low-latency tier for short, structured tasks
 MAX_TOKENS = 1024  # Response token limit
 MAX_CONTEXT_TOKENS = 8192  # For detailed document analysis
 MAX_CHUNK_TOKENS = 512  # For document chunks
+DOCUMENT_CHUNK_TOKENS = 150  # Chunk size used when splitting documents
+DOCUMENT_CHUNK_OVERLAP_TOKENS = 25  # Overlap between consecutive document chunks
 TEMPERATURE = 0.7
-SIMILARITY_THRESHOLD = 0.2  # Threshold for vector similarity
-TOP_K = 20  # Number of similar messages to retrieve
+MAP_REDUCE_CONCURRENCY = 4  # Parallel slice summaries when context overflows
+MAP_REDUCE_CACHE_SIZE = 256  # Slice summaries cached by content hash
+COMPRESSED_CONTEXT_TOKENS = 2048  # Retrieved-source tokens kept per chat after extractive compression
+EXTRACTIVE_MAX_RATIO = 4  # Overflow ratio up to which context is compressed locally instead of map-reduced
+ANSWER_CACHE_THRESHOLD = 0.93  # Question similarity needed to reuse a cached chat answer
+ANSWER_CACHE_TTL = 3600  # Seconds a cached chat answer stays valid
+ANSWER_CACHE_SIZE = 1000  # Cached chat answers kept across all channels
+CHAT_DEADLINE_SECONDS = 20  # End-to-end time budget for a chat answer
+DEADLINE_COMPLETION_RESERVE = 8  # Seconds optional stages leave for the completion
+DEADLINE_FALLBACK_RESERVE = 4  # Seconds left under which a completion goes straight to its fallback tier
+DEADLINE_ROUTED_SHARE = 0.6  # Share of the time left under a deadline a completion gives its routed model; the rest covers the fallback
+THREAD_MEMORY_TURNS = 4  # Recent exchanges kept verbatim per assistant thread
+THREAD_MEMORY_MAX_TURNS = 12  # Hard cap on exchanges kept while folds are pending or failing
+THREAD_MEMORY_TTL = 21600  # Seconds an idle thread's memory is kept
+THREAD_MEMORY_SIZE = 500  # Threads remembered at once
+THREAD_CONTEXT_REUSE_THRESHOLD = 0.75  # Follow-up similarity needed to reuse a thread's retrieved context
+ROLLING_SUMMARY_FETCH_LIMIT = 1000  # Max new messages folded into a channel summary at once
+SUMMARIZE_BATCH_CONCURRENCY = 4  # Channel summaries generated at once by /summarize/batch
+PERSONA_REFRESH_BATCH = 20  # New messages from a user before their persona digest is refreshed
+PERSONA_MAX_EXAMPLES = 8  # Representative messages kept per persona digest
+VOICE_SESSION_TTL = 3600  # Seconds an idle phone call's session is kept
+VOICE_SESSION_SIZE = 200  # Phone call sessions kept at once
+VOICE_SESSION_TURNS = 3  # Recent exchanges kept verbatim per call
+VOICE_DRIFT_THRESHOLD = 0.5  # Turn similarity to the session topic below which context is refreshed
+VOICE_WARM_WAIT = 3  # Seconds a speech turn waits for its session to finish warming
+
+# Twilio
+TWILIO_API_BASE_URL = "https://api.twilio.com"  # Overridden by the TWILIO_API_BASE_URL env var, e.g. for a local stand-in
+TWILIO_TIMEOUT = 10  # Seconds per Twilio REST request
+TWILIO_CONNECT_TIMEOUT = 3  # Seconds to open a connection to Twilio
+TWILIO_MAX_CONNECTIONS = 10  # Pooled connections to the Twilio API
+
+# Adaptive Retrieval
+# Per channel type: candidates fetched first (initial_k), at most max_k, never fewer than min_k
+# above threshold, a cut at the first score drop larger than max_gap, and a cap of context_tokens
+# on the retrieved text; chunk_k bounds the chunks expanded per matched document
+RETRIEVAL_DEFAULTS = {
+    'public': {'initial_k': 8, 'max_k': 24, 'min_k': 3, 'threshold': 0.25, 'max_gap': 0.08, 'context_tokens': 3000, 'chunk_k': 12},
+    'private': {'initial_k': 8, 'max_k': 24, 'min_k': 3, 'threshold': 0.25, 'max_gap': 0.08, 'context_tokens': 3000, 'chunk_k': 12},
+    'dm': {'initial_k': 6, 'max_k': 16, 'min_k': 2, 'threshold': 0.25, 'max_gap': 0.08, 'context_tokens': 2000, 'chunk_k': 8},
+    'assistant': {'initial_k': 10, 'max_k': 30, 'min_k': 3, 'threshold': 0.2, 'max_gap': 0.1, 'context_tokens': 4000, 'chunk_k': 16}
+}
+
+# Model Routing
+MODEL_TIERS = {
+    'flagship': MODEL_NAME,
+    'fast': FAST_MODEL_NAME
+}
+
+# Tier, latency budget (seconds) and governor priority per LLM call site; a call over budget is retried on its fallback tier
+MODEL_ROUTES = {
+    'chat': {'tier': 'flagship', 'budget': 30, 'fallback': 'fast', 'priority': 'chat'},
+    'summarize': {'tier': 'flagship', 'budget': 45, 'fallback': 'fast', 'priority': 'summarize'},
+    'generate_response': {'tier': 'flagship', 'budget': 30, 'fallback': 'fast', 'priority': 'chat'},
+    'impersonation': {'tier': 'flagship', 'budget': 30, 'fallback': 'fast', 'priority': 'chat'},
+    'offline_reply': {'tier': 'flagship', 'budget': 30, 'fallback': 'fast', 'priority': 'chat'},
+    'thread_summary': {'tier': 'fast', 'budget': 15, 'priority': 'summarize'},
+    'persona_digest': {'tier': 'flagship', 'budget': 60, 'fallback': 'fast', 'priority': 'summarize'},
+    'document_summary': {'tier': 'flagship', 'budget': 120, 'fallback': 'fast', 'priority': 'ingestion'},
+    'user_style': {'tier': 'fast', 'budget': 15, 'priority': 'chat'},
+    'map_reduce': {'tier': 'fast', 'budget': 30, 'priority': 'summarize'},
+    'query_analysis': {'tier': 'fast', 'budget': 5, 'priority': 'chat'},
+    'call_analysis': {'tier': 'fast', 'budget': 5, 'priority': 'voice'},
+    'call_script': {'tier': 'fast', 'budget': 5, 'priority': 'voice'},
+    'voice_reply': {'tier': 'fast', 'budget': 4, 'priority': 'voice'}
+}
+
+# OpenAI Governor
+LLM_PRIORITIES = {
+    'voice': 0,
+    'chat': 1,
+    'summarize': 2,
+    'ingestion': 3
+}
+LLM_MAX_CONCURRENCY = 8  # Upper bound on concurrent OpenAI calls; halved on each 429
+LLM_REQUESTS_PER_MINUTE = 500
+LLM_TOKENS_PER_MINUTE = 300000
+LLM_MAX_RETRIES = 3  # Retries for rate limits and transient errors
 
 # Service URLs
 ASSISTANT_SERVICE_URL = "http://localhost:8000"  # Default service URL
 
+# Phone Constants
+PHONE_NUMBER_PATTERN = r'\+?1?\d{10,}'
+
 # Special User IDs
 ASSISTANT_BOT_USER_ID = "assistant-bot"
 
@@ -48,6 +48,7 @@ async def startup():
 @app.on_event("shutdown")
 async def shutdown():
     await prisma.disconnect()
+    await phone.twilio_manager.client.close()
 
 @app.get("/health")
 async def health_check():
@@ -21,8 +21,10 @@ class RetrieveRequest(BaseModel):
     user_id: Optional[str] = None
     channel_id: str
     channel_type: str
-    top_k: int = 20
-    threshold: float = 0.01
+    top_k: Optional[int] = None  # Upper bound on chat hits; defaults per channel type
+    threshold: Optional[float] = None  # Minimum similarity; defaults per channel type
+    multi_query: bool = True  # Also search the analyzer's expanded queries and fuse the results
+    query_embedding: Optional[List[float]] = None  # Embedding of query already computed by the caller
 
 class RetrieveResponse(BaseModel):
     query: str
@@ -34,6 +36,7 @@ class VectorUpdateRequest(BaseModel):
     user_id: str
     content: str
     sender_name: str
+    message_id: Optional[str] = None  # Lets /vector/delete find the message in the hot tier
 
     @validator('channel_type')
     def validate_channel_type(cls, v):
@@ -56,6 +59,8 @@ class ProcessDocumentResponse(BaseModel):
     message: str
     file_name: str
     chunks_created: int
+    chunks_embedded: Optional[int] = None
+    chunks_deleted: Optional[int] = None
 
 class CallResponse(BaseModel):
     message: str
@@ -82,6 +87,7 @@ class AssistantResponse(BaseModel):
     context_used: List[Message]
     confidence: float
     rich_content: Optional[RichContent] = None
+    degraded: Optional[List[str]] = None  # Stages cut short to meet the request deadline
 
 class FileObject(BaseModel):
     id: str
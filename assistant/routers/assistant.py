@@ -1,16 +1,31 @@
-from fastapi import APIRouter, HTTPException, Body, Request
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Body, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable
 import os
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
-from constants import MODEL_NAME, MAX_TOKENS, MAX_CONTEXT_TOKENS, MAX_CHUNK_TOKENS, TEMPERATURE, SIMILARITY_THRESHOLD, TOP_K
+from constants import CHAT_DEADLINE_SECONDS, MAX_TOKENS, MAX_CONTEXT_TOKENS, MAX_CHUNK_TOKENS, TEMPERATURE, CHAT_INDEX_NAME, ROLLING_SUMMARY_FETCH_LIMIT, SUMMARIZE_BATCH_CONCURRENCY, COMPRESSED_CONTEXT_TOKENS, EXTRACTIVE_MAX_RATIO
 from models import AssistantResponse, Message, RetrieveRequest, RichContent
-from routers.vector import retrieve_similar_user_messages, retrieve_similar_channel_messages, UserMessagesRequest, ChannelMessagesRequest, retrieve_similar_messages
+from routers.vector import retrieve_similar_user_messages, search_channel_messages, UserMessagesRequest, retrieve_similar_messages, pc, embeddings, persona_manager
 from utils import get_prisma
 from clients.phone_client import PhoneServiceClient
+from services.tokenizer import count_tokens
+from services.map_reduce import MapReduceSummarizer
+from services.compressor import compress_sources, compress_text
+from services.llm import CoalescingOpenAI, openai_client, llm_stats
+from services.context_packer import pack_context
+from services.persona_digests import PersonaDigest
+from services.channel_summaries import ChannelSummaryStore, ChannelSummaryState, latest_timestamp
+from services.answer_cache import answer_cache, answer_scope, answer_dependencies
+from services.deadline import Deadline, run_stage
+from services.conversations import ConversationStore
 import logging
-from pydantic import BaseModel
+import json
+import re
+import asyncio
+from pydantic import BaseModel, ConfigDict
+from contextlib import nullcontext
 from datetime import datetime
+import time
 
 # Load environment variables
 load_dotenv()
@@ -18,13 +33,11 @@ load_dotenv()
 # Initialize router
 router = APIRouter()
 
-# Initialize components
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 class AssistantManager:
-    def __init__(self, client: AsyncOpenAI):
+    def __init__(self, client: CoalescingOpenAI):
         self.client = client
         self.phone_client = PhoneServiceClient()
+        self.summarizer = MapReduceSummarizer(client)
         
     async def __aenter__(self):
         return self
@@ -33,12 +46,37 @@ class AssistantManager:
         if hasattr(self, 'phone_client'):
             await self.phone_client.close()
 
-    async def analyze_user_style(self, messages: List[Dict[str, Any]]) -> str:
-        """Analyze a user's communication style from their messages."""
+    async def get_persona(self, user_id: str, limit: int = 100) -> Optional[PersonaDigest]:
+        """Return the user's persona digest, building it from their history the first time."""
+        digest = await asyncio.to_thread(persona_manager.store.get, user_id)
+        if digest:
+            return digest
+
+        retrieve_response = await retrieve_similar_user_messages(
+            UserMessagesRequest(user_id=user_id, top_k=limit)
+        )
+        if not retrieve_response.messages:
+            return None
+        return await persona_manager.refresh(
+            user_id,
+            retrieve_response.messages[0].sender_name,
+            [msg.content for msg in retrieve_response.messages]
+        )
+
+    async def analyze_user_style(self, messages: List[Dict[str, Any]], user_id: Optional[str] = None) -> str:
+        """Analyze a user's communication style from their messages.
+
+        With a user_id the stored persona digest is used instead of a new analysis.
+        """
         try:
+            if user_id:
+                digest = await self.get_persona(user_id)
+                if digest and digest.style:
+                    return digest.style
+
             messages_text = "\n".join([msg["content"] for msg in messages])
-            completion = await self.client.chat.completions.create(
-                model=MODEL_NAME,
+            completion = await self.client.complete(
+                "user_style",
                 messages=[
                     {
                         "role": "system",
@@ -72,8 +110,8 @@ class AssistantManager:
                 for msg in recent_messages[-5:]  # Last 5 messages for immediate context
             ])
 
-            completion = await self.client.chat.completions.create(
-                model=MODEL_NAME,
+            completion = await self.client.complete(
+                "impersonation",
                 messages=[
                     {
                         "role": "system",
@@ -103,31 +141,18 @@ Important: Never acknowledge being AI, never apologize, never explain. Simply BE
     async def generate_response(self, username: str, message: str, context: str) -> str:
         """Generate a response using the OpenAI API."""
         # For document analysis, we want to keep as much context as possible
-        if len(context) > MAX_CONTEXT_TOKENS * 4:
-            # Split context into chunks and summarize each chunk
-            chunks = [context[i:i + MAX_CONTEXT_TOKENS * 4] for i in range(0, len(context), MAX_CONTEXT_TOKENS * 4)]
-            summarized_chunks = []
-            
-            for chunk in chunks[:3]:  # Process up to 3 chunks to stay within limits
-                try:
-                    summary = await self.client.chat.completions.create(
-                        model=MODEL_NAME,
-                        messages=[
-                            {"role": "system", "content": "Summarize this content while preserving key details and facts:"},
-                            {"role": "user", "content": chunk}
-                        ],
-                        temperature=0.3,  # Lower temperature for more factual summaries
-                        max_tokens=1000
-                    )
-                    summarized_chunks.append(summary.choices[0].message.content)
-                except Exception as e:
-                    logging.error(f"Error summarizing chunk: {str(e)}")
-                    continue
-            
-            context = "\n\n".join(summarized_chunks) + "\n\n[Context was summarized for length]"
+        context_tokens = count_tokens(context)
+        if context_tokens > MAX_CONTEXT_TOKENS * EXTRACTIVE_MAX_RATIO:
+            # Far too long to trim: summarize every slice concurrently, reducing again while it still overflows
+            context = await self.summarizer.summarize(context, MAX_CONTEXT_TOKENS)
+            context += "\n\n[Context was summarized for length]"
+        elif context_tokens > MAX_CONTEXT_TOKENS:
+            # Keep the sentences most relevant to the message, no LLM call needed
+            context = compress_text(context, message, MAX_CONTEXT_TOKENS)
+            context += "\n\n[Context was trimmed for length]"
             
-        completion = await self.client.chat.completions.create(
-            model=MODEL_NAME,
+        completion = await self.client.complete(
+            "generate_response",
             messages=[
                 {
                     "role": "system",
@@ -153,36 +178,20 @@ Important guidelines:
 
     async def build_context(self, similar_messages: List[Message]) -> str:
         """Build the context string for the assistant."""
-        context = "You are ChatGenius, a helpful AI assistant specializing in detailed document analysis. "
-        context += "You help users by providing comprehensive, accurate information from documents and conversation history. "
-        context += "When answering questions about documents, include specific details, quotes, and references to support your answers. "
-        context += "Be thorough but clear in your explanations.\n\n"
-        
-        if similar_messages:
-            context += "Here are the relevant document sections and messages that might help with context:\n"
-            total_chars = 0
-            for msg in similar_messages[:TOP_K]:  # Include more messages for better context
-                # For document chunks, preserve more content
-                msg_chars = len(msg.content) + len(msg.sender_name) + 2
-                
-                if msg_chars > MAX_CHUNK_TOKENS * 4:
-                    # For long chunks, try to preserve complete sentences
-                    truncated_content = msg.content[:(MAX_CHUNK_TOKENS * 4) - len(msg.sender_name) - 20]
-                    last_period = truncated_content.rfind('.')
-                    if last_period > 0:
-                        truncated_content = truncated_content[:last_period + 1]
-                    context += f"{msg.sender_name}: {truncated_content}\n"
-                    total_chars += len(truncated_content) + len(msg.sender_name) + 2
-                else:
-                    context += f"{msg.sender_name}: {msg.content}\n"
-                    total_chars += msg_chars
-                
-                if total_chars > MAX_CONTEXT_TOKENS * 4:
-                    context += "\n[Additional content available but truncated for length]\n"
-                    break
-            context += "\n"
-        
-        return context
+        header = "You are ChatGenius, a helpful AI assistant specializing in detailed document analysis. "
+        header += "You help users by providing comprehensive, accurate information from documents and conversation history. "
+        header += "When answering questions about documents, include specific details, quotes, and references to support your answers. "
+        header += "Be thorough but clear in your explanations.\n\n"
+
+        packed = pack_context(
+            similar_messages,
+            MAX_CONTEXT_TOKENS,
+            header=header,
+            intro="Here are the relevant document sections and messages that might help with context:\n",
+            footer="\n",
+            max_source_tokens=MAX_CHUNK_TOKENS  # For long chunks, try to preserve complete sentences
+        )
+        return packed.text
 
     async def process_call_status(
         self,
@@ -197,6 +206,15 @@ Important guidelines:
     ) -> Dict[str, str]:
         """Process call status updates and recordings."""
         try:
+            # Drive the call's lifecycle; it posts the recording once the call is done
+            await self.phone_client.report_call_status(
+                call_sid,
+                call_status=call_status,
+                recording_status=recording_status,
+                recording_url=recording_url,
+                channel_id=channel_id
+            )
+
             # If this is a recording callback
             if recording_status:
                 logging.info(f"Recording status update: {recording_status}")
@@ -236,77 +254,234 @@ class SummarizeRequest(BaseModel):
     query: str
     limit: int = 100
 
+# Words that make up a plain "summarize this channel" request, as opposed to a question about it
+SUMMARY_QUERY_WORDS = {
+    "@assistant", "summarize", "summarise", "summary", "give", "me", "a", "an", "the", "this", "channel",
+    "please", "of", "recent", "discussion", "conversation", "in", "what", "happened", "catch", "up"
+}
+
+def is_summary_query(query: str) -> bool:
+    """Whether a summarize request asks for the channel summary rather than a specific question."""
+    words = re.findall(r"[@\w']+", query.lower())
+    return all(word in SUMMARY_QUERY_WORDS for word in words)
+
+class BatchSummarizeRequest(BaseModel):
+    channel_ids: List[str]
+    query: str = "Summarize the recent discussion in this channel"
+    queries: Dict[str, str] = {}  # Per-channel queries overriding query
+    limit: int = 100
+
+class ChatRequest(BaseModel):
+    message: str
+    channel_id: str
+    user_id: str
+    channel_type: str
+    thread_id: Optional[str] = None
+    username: str
+
+class PreparedCompletion(BaseModel):
+    """A completion request plus the metadata returned alongside its answer."""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    messages: List[Dict[str, str]] = []
+    site: str = "chat"  # Call site used for model routing
+    temperature: float = TEMPERATURE
+    context_used: List[Message] = []
+    confidence: float = 0.9
+    rich_content: Optional[RichContent] = None
+    immediate: Optional[AssistantResponse] = None  # Answer that needs no completion
+    after_complete: Optional[Callable[[str], Awaitable[None]]] = None  # Persists state derived from the answer
+    deadline: Optional[Deadline] = None
+
+    def activate(self):
+        """Run the completion under the request deadline, if there is one."""
+        return self.deadline.activate() if self.deadline else nullcontext()
+
+    async def finish(self, response: str) -> AssistantResponse:
+        if self.after_complete:
+            try:
+                await self.after_complete(response)
+            except Exception as e:
+                logging.error(f"Error in completion follow-up: {str(e)}")
+        return self.to_response(response)
+
+    def to_response(self, response: str) -> AssistantResponse:
+        rich_content = self.rich_content.model_copy(update={"content": response}) if self.rich_content else None
+        return AssistantResponse(
+            response=response,
+            context_used=self.context_used,
+            confidence=self.confidence,
+            rich_content=rich_content,
+            degraded=self.deadline.degraded if self.deadline and self.deadline.degraded else None
+        )
+
 # Initialize components
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 assistant_manager = AssistantManager(openai_client)
+channel_summary_store = ChannelSummaryStore(pc.Index(CHAT_INDEX_NAME))
+conversation_store = ConversationStore(openai_client)
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def final_event(response: AssistantResponse) -> str:
+    """Build the closing event carrying the full answer and its metadata."""
+    payload = response.model_dump(mode="json")
+    rich_content = payload.get("rich_content") or {}
+    payload["sources"] = (rich_content.get("metadata") or {}).get("sources", [])
+    return sse_event("done", payload)
+
+async def run_completion(prepared: PreparedCompletion) -> AssistantResponse:
+    """Run a prepared completion to the end."""
+    if prepared.immediate:
+        return prepared.immediate
+    with prepared.activate():
+        completion = await openai_client.complete(
+            prepared.site,
+            messages=prepared.messages,
+            temperature=prepared.temperature,
+            max_tokens=MAX_TOKENS
+        )
+    return await prepared.finish(completion.choices[0].message.content)
 
-@router.post("/chat", response_model=AssistantResponse)
-async def chat(
-    message: str = Body(...),
-    channel_id: str = Body(...),
-    user_id: str = Body(...),
-    channel_type: str = Body(...),
-    thread_id: Optional[str] = Body(None),
-    username: str = Body(...)
-):
-    """Generate a response to a chat message."""
+async def stream_completion(prepared: PreparedCompletion) -> AsyncIterator[str]:
+    """Stream a prepared completion as `token` events followed by one `done` event."""
+    if prepared.immediate:
+        yield final_event(prepared.immediate)
+        return
     try:
-        # Check if this is a phone call request
-        is_call, call_details = await assistant_manager.phone_client.extract_call_details(
-            message,
-            {"channel_id": channel_id, "user_id": user_id}
-        )
-        
-        if is_call:
-            # Handle phone call
-            call_response = await assistant_manager.phone_client.make_call(
-                call_details["phone_number"],
-                call_details["message"],
-                channel_id=channel_id,
-                user_id=user_id,
-                thread_id=thread_id
+        parts = []
+        with prepared.activate():
+            stream = await openai_client.stream(
+                prepared.site,
+                messages=prepared.messages,
+                temperature=prepared.temperature,
+                max_tokens=MAX_TOKENS
             )
-            return AssistantResponse(
-                response="I'll make that call for you right away.",
-                context_used=[],
-                confidence=1.0,
-                rich_content=RichContent(
-                    type="call",
-                    content="Call initiated",
-                    metadata={
-                        "call_sid": call_response.get("call_sid"),
-                        "phone_number": call_details["phone_number"],
-                        "message": call_details["message"]
-                    }
-                )
+            async for chunk in stream:
+                if chunk.usage:
+                    openai_client.record_usage(prepared.site, chunk.usage)
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if token:
+                    parts.append(token)
+                    yield sse_event("token", {"content": token})
+        yield final_event(await prepared.finish("".join(parts)))
+    except Exception as e:
+        logging.error(f"Error streaming completion: {str(e)}")
+        yield sse_event("error", {"detail": str(e)})
+
+def event_stream(prepared: PreparedCompletion) -> StreamingResponse:
+    return StreamingResponse(
+        stream_completion(prepared),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def format_chat_source(msg: Message) -> str:
+    """Format a retrieved message or document chunk with its citation."""
+    if msg.channel_name == "Document":
+        # Document content already starts with its [Source: ...] reference
+        return msg.content
+    return f"[From #{msg.channel_name} by @{msg.sender_name}]: {msg.content}"
+
+def cached_chat_response(cached: AssistantResponse, request: ChatRequest) -> AssistantResponse:
+    """Re-address a cached answer to the user asking now."""
+    rich_content = cached.rich_content
+    if rich_content:
+        metadata = dict(rich_content.metadata or {})
+        metadata.update({
+            "user": {"id": request.user_id, "username": request.username},
+            "thread_id": request.thread_id,
+            "cached": True
+        })
+        rich_content = rich_content.model_copy(update={"metadata": metadata})
+    return cached.model_copy(update={"rich_content": rich_content})
+
+async def prepare_chat(request: ChatRequest) -> PreparedCompletion:
+    """Handle call requests and retrieve context for a chat message."""
+    message = request.message
+    channel_id = request.channel_id
+    user_id = request.user_id
+    channel_type = request.channel_type
+    thread_id = request.thread_id
+    username = request.username
+
+    # Check if this is a phone call request
+    is_call, call_details = await assistant_manager.phone_client.extract_call_details(
+        message,
+        {"channel_id": channel_id, "user_id": user_id}
+    )
+    
+    if is_call:
+        # Handle phone call
+        call_response = await assistant_manager.phone_client.make_call(
+            call_details["phone_number"],
+            call_details["message"],
+            channel_id=channel_id,
+            user_id=user_id,
+            thread_id=thread_id
+        )
+        return PreparedCompletion(immediate=AssistantResponse(
+            response="I'll make that call for you right away.",
+            context_used=[],
+            confidence=1.0,
+            rich_content=RichContent(
+                type="call",
+                content="Call initiated",
+                metadata={
+                    "call_sid": call_response.get("call_sid"),
+                    "phone_number": call_details["phone_number"],
+                    "message": call_details["message"]
+                }
             )
-
-        # Get similar messages for context
+        ))
+
+    # Answer paraphrases of a recent question from the cache
+    started_at = time.time()
+    scope = answer_scope(channel_type, channel_id, user_id)
+    question_embedding = await run_stage("answer_cache", lambda: embeddings.aembed_query(message), None)
+    memory = conversation_store.get(thread_id, scope) if thread_id else None
+    # Follow-ups depend on the thread, so only fresh questions use the answer cache
+    is_follow_up = bool(memory and memory.turns)
+    cached = answer_cache.get(scope, question_embedding) if question_embedding and not is_follow_up else None
+    if cached:
+        response = cached_chat_response(cached, request)
+        if thread_id:
+            conversation_store.add_turn(thread_id, scope, message, response.response)
+        return PreparedCompletion(immediate=response)
+
+    # Follow-ups on the same topic reuse the context retrieved earlier in the thread
+    retrieved = memory.reusable_context(question_embedding) if memory else None
+    if retrieved is None:
         retrieve_response = await retrieve_similar_messages(
             RetrieveRequest(
                 query=message,
                 channel_id=channel_id,
                 user_id=user_id,
                 channel_type=channel_type,
-                top_k=TOP_K,
-                threshold=SIMILARITY_THRESHOLD
+                query_embedding=question_embedding
             )
         )
-
-        channel_set = set()
-        for msg in retrieve_response.messages:
-            channel_set.add(msg.channel_name)
-        # Build context with metadata from the most recent relevant message
-        channel_info = None
-        if retrieve_response.messages:
-            latest_msg = retrieve_response.messages[0]
-            channel_info = {
-                "name": latest_msg.channel_name,
-                "id": channel_id,
-                "type": channel_type
-            }
-
-        context = f"""You are ChatGenius, a helpful AI assistant. You help users by providing accurate and relevant information based on the conversation history.
+        retrieved = retrieve_response.messages
+        if thread_id:
+            conversation_store.set_context(thread_id, scope, retrieved, question_embedding)
+
+    channel_set = set()
+    for msg in retrieved:
+        channel_set.add(msg.channel_name)
+    # Build context with metadata from the most recent relevant message
+    channel_info = None
+    if retrieved:
+        latest_msg = retrieved[0]
+        channel_info = {
+            "name": latest_msg.channel_name,
+            "id": channel_id,
+            "type": channel_type
+        }
+
+    context = f"""You are ChatGenius, a helpful AI assistant. You help users by providing accurate and relevant information based on the conversation history.
 
 Current conversation metadata:
 - Channel name: #{channel_info["name"] if channel_info else 'unknown'} ({channel_id})
@@ -318,72 +493,105 @@ When using information from the context, always cite the source:
 - For documents: mention the document name (e.g. 'According to the document "filename.pdf"...')
 
 Be direct and helpful in your responses. You can reference the channel and user information above when relevant to the conversation.\n\n"""
-        
-        if retrieve_response.messages:
-            context += "Here are some relevant previous messages and documents that might help with context:\n"
-            for msg in retrieve_response.messages[:TOP_K]:
-                if hasattr(msg, "metadata") and hasattr(msg.metadata, "file_name") and msg.metadata.get("file_name"):
-                    context += f"[From document '{msg.metadata.get('file_name')}' chunk {msg.metadata.get('chunk_index', 'unknown')}]: {msg.content}\n"
-                else:
-                    context += f"[From #{msg.channel_name} by @{msg.sender_name}]: {msg.content}\n"
-            context += "\n"
-            
-        # Truncate context if it's too long
-        if len(context) > MAX_CONTEXT_TOKENS * 4:
-            context = context[:MAX_CONTEXT_TOKENS * 4] + "...\n[Context truncated for length]"
-        
-        # Generate response
-        completion = await openai_client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {
-                    "role": "system", 
-                    "content": context + "\nWhen referencing information from the context, always cite the source by mentioning the channel and sender (e.g. 'According to @username in #channel...')"
+    if memory and memory.summary:
+        context += f"Summary of this thread so far:\n{memory.summary}\n\n"
+
+    # Keep only the sentences that matter for this message before packing
+    relevant = compress_sources(retrieved, message, COMPRESSED_CONTEXT_TOKENS)
+
+    # Recent turns of the thread share the context budget
+    recent_turns = list(memory.turns) if memory else []
+    packed = pack_context(
+        relevant,
+        MAX_CONTEXT_TOKENS - (memory.history_tokens() if memory else 0),
+        header=context,
+        intro="Here are some relevant previous messages and documents that might help with context:\n",
+        footer="\n\nWhen referencing information from the context, always cite the source by mentioning the channel and sender (e.g. 'According to @username in #channel...')",
+        format_source=format_chat_source,
+        max_source_tokens=MAX_CHUNK_TOKENS
+    )
+    
+    # Create source metadata
+    sources = [{
+        "channel_name": msg.channel_name,
+        "sender_name": msg.sender_name,
+        "similarity": msg.similarity,
+        "message_id": msg.message_id,
+        "type": "message",
+        # Add document metadata if it exists
+        "document": {
+            "file_name": msg.metadata.get("file_name") if hasattr(msg, "metadata") and hasattr(msg.metadata, "file_name") else None,
+            "file_id": msg.metadata.get("file_id") if hasattr(msg, "metadata") else None,
+            "chunk_index": msg.metadata.get("chunk_index") if hasattr(msg, "metadata") else None
+        } if hasattr(msg, "metadata") and hasattr(msg.metadata, "file_name") and msg.metadata.get("file_name") else None
+    } for msg in packed.sources]
+    
+    prepared = PreparedCompletion(
+        messages=[
+            {"role": "system", "content": packed.text},
+            *recent_turns,
+            {"role": "user", "content": message}
+        ],
+        context_used=packed.sources,
+        rich_content=RichContent(
+            type="chat",
+            content="",
+            metadata={
+                "channel": channel_info or {
+                    "id": channel_id,
+                    "type": channel_type
                 },
-                {"role": "user", "content": message}
-            ],
-            temperature=TEMPERATURE,
-            max_tokens=MAX_TOKENS
+                "user": {
+                    "id": user_id,
+                    "username": username
+                },
+                "thread_id": thread_id,
+                "sources": sources
+            }
         )
-        
-        response = completion.choices[0].message.content
-        
-        # Create source metadata
-        sources = [{
-            "channel_name": msg.channel_name,
-            "sender_name": msg.sender_name,
-            "similarity": msg.similarity,
-            "message_id": msg.message_id,
-            "type": "message",
-            # Add document metadata if it exists
-            "document": {
-                "file_name": msg.metadata.get("file_name") if hasattr(msg, "metadata") and hasattr(msg.metadata, "file_name") else None,
-                "file_id": msg.metadata.get("file_id") if hasattr(msg, "metadata") else None,
-                "chunk_index": msg.metadata.get("chunk_index") if hasattr(msg, "metadata") else None
-            } if hasattr(msg, "metadata") and hasattr(msg.metadata, "file_name") and msg.metadata.get("file_name") else None
-        } for msg in retrieve_response.messages]
-        
-        return AssistantResponse(
-            response=response,
-            context_used=retrieve_response.messages,
-            confidence=0.9,
-            rich_content=RichContent(
-                type="chat",
-                content=response,
-                metadata={
-                    "channel": channel_info or {
-                        "id": channel_id,
-                        "type": channel_type
-                    },
-                    "user": {
-                        "id": user_id,
-                        "username": username
-                    },
-                    "thread_id": thread_id,
-                    "sources": sources
-                }
-            )
+    )
+
+    async def remember_answer(response: str):
+        if thread_id:
+            conversation_store.add_turn(thread_id, scope, message, response)
+        # Follow-up answers depend on their thread, and answers cut short by the deadline are not worth reusing
+        if not question_embedding or is_follow_up or (prepared.deadline and prepared.deadline.degraded):
+            return
+        answer_cache.put(
+            scope,
+            message,
+            question_embedding,
+            prepared.to_response(response),
+            answer_dependencies(channel_type, channel_id, user_id),
+            started_at
         )
+
+    prepared.after_complete = remember_answer
+    return prepared
+
+@router.post("/chat", response_model=AssistantResponse)
+async def chat(
+    message: str = Body(...),
+    channel_id: str = Body(...),
+    user_id: str = Body(...),
+    channel_type: str = Body(...),
+    thread_id: Optional[str] = Body(None),
+    username: str = Body(...)
+):
+    """Generate a response to a chat message."""
+    try:
+        deadline = Deadline(CHAT_DEADLINE_SECONDS)
+        with deadline.activate():
+            prepared = await prepare_chat(ChatRequest(
+                message=message,
+                channel_id=channel_id,
+                user_id=user_id,
+                channel_type=channel_type,
+                thread_id=thread_id,
+                username=username
+            ))
+        prepared.deadline = deadline
+        return await run_completion(prepared)
         
     except Exception as e:
         logging.error(f"Error in chat endpoint: {str(e)}")
@@ -392,6 +600,19 @@ Be direct and helpful in your responses. You can reference the channel and user
             logging.error(f"Traceback: {''.join(traceback.format_tb(e.__traceback__))}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Stream a response to a chat message as server-sent events."""
+    try:
+        deadline = Deadline(CHAT_DEADLINE_SECONDS)
+        with deadline.activate():
+            prepared = await prepare_chat(request)
+        prepared.deadline = deadline
+        return event_stream(prepared)
+    except Exception as e:
+        logging.error(f"Error in chat stream endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/call-status")
 async def c(
     request: Request,
@@ -403,7 +624,9 @@ async def c(
     RecordingStatus: str = Body(None),
     AccountSid: str = Body(None),
     ChannelId: str = Body(None),
-    UserId: str = Body(None)
+    UserId: str = Body(None),
+    channel_id: Optional[str] = Query(None),  # Set on the callback URL when the call is placed
+    user_id: Optional[str] = Query(None)
 ):
     """Handle call status and recording callbacks."""
     try:
@@ -414,8 +637,8 @@ async def c(
             recording_url=RecordingUrl,
             recording_duration=RecordingDuration,
             recording_status=RecordingStatus,
-            channel_id=ChannelId,
-            user_id=UserId
+            channel_id=ChannelId or channel_id,
+            user_id=UserId or user_id
         )
         
     except Exception as e:
@@ -425,39 +648,96 @@ async def c(
             logging.error(f"Traceback: {''.join(traceback.format_tb(e.__traceback__))}")
         raise HTTPException(status_code=500, detail=str(e)) 
 
-@router.post("/summarize/{channel_id}", response_model=AssistantResponse)
-async def summarize_channel(
-    channel_id: str,
-    request: SummarizeRequest
-):
-    """Generate a summary or answer questions about a specific channel using vector search."""
-    try:
-        # Get messages from vector store
-        retrieve_response = await retrieve_similar_channel_messages(
-            ChannelMessagesRequest(
-                channel_id=channel_id,
-                query=request.query,
-                top_k=request.limit
-            )
-        )
+def summary_saver(channel_id: str, watermark: float, message_count: int) -> Callable[[str], Awaitable[None]]:
+    """Build the callback that persists a channel's new summary state."""
+    async def save(summary: str):
+        embedding = await embeddings.aembed_query(summary)
+        await asyncio.to_thread(channel_summary_store.put, ChannelSummaryState(
+            channel_id=channel_id,
+            summary=summary,
+            embedding=embedding,
+            watermark=watermark,
+            message_count=message_count,
+            updated_at=time.time()
+        ))
+    return save
+
+async def prepare_rolling_summary(state: ChannelSummaryState) -> PreparedCompletion:
+    """Fold messages posted since the last summary into it, or reuse it when nothing changed."""
+    new_messages = await asyncio.to_thread(channel_summary_store.new_messages, state, ROLLING_SUMMARY_FETCH_LIMIT)
+    if not new_messages:
+        return PreparedCompletion(immediate=AssistantResponse(
+            response=state.summary,
+            context_used=[],
+            confidence=0.9
+        ))
 
-        if not retrieve_response.messages:
-            return AssistantResponse(
-                response="No messages found in this channel.",
-                context_used=[],
-                confidence=0.0
-            )
+    context = pack_context(
+        new_messages,
+        MAX_CONTEXT_TOKENS - count_tokens(state.summary),
+        max_source_tokens=MAX_CHUNK_TOKENS
+    ).text
 
-        # Build context from messages
-        context = await assistant_manager.build_context(retrieve_response.messages)
-        
-        # Generate summary/response
-        completion = await openai_client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"""You are analyzing a chat channel. Your task is to provide a detailed response based on the channel's content.
+    return PreparedCompletion(
+        site="summarize",
+        messages=[
+            {
+                "role": "system",
+                "content": f"""You maintain a running summary of a chat channel. Update the summary with the new messages below.
+
+Current summary:
+{state.summary}
+
+New messages since the last summary (oldest first):
+{context}
+
+Important:
+1. Keep points from the current summary that are still relevant
+2. Organize by key topics or themes
+3. Be specific and reference actual content from the messages
+4. Don't apologize or mention being an AI - just provide the updated summary"""
+            }
+        ],
+        temperature=0.3,  # Lower temperature for more factual responses
+        context_used=new_messages,
+        after_complete=summary_saver(
+            state.channel_id,
+            latest_timestamp(new_messages, state.watermark),
+            state.message_count + len(new_messages)
+        )
+    )
+
+async def prepare_summary(channel_id: str, request: SummarizeRequest) -> PreparedCompletion:
+    """Retrieve channel messages and build the summary prompt."""
+    # Only plain summary requests share the channel's rolling summary; questions get their own retrieval
+    state = await asyncio.to_thread(channel_summary_store.get, channel_id) if is_summary_query(request.query) else None
+    if state:
+        return await prepare_rolling_summary(state)
+    return await prepare_first_summary(channel_id, request, await embeddings.aembed_query(request.query))
+
+async def prepare_first_summary(channel_id: str, request: SummarizeRequest, query_embedding: List[float]) -> PreparedCompletion:
+    """No summary yet: build one from the channel's messages."""
+    request_start = time.time()
+
+    # Get messages from vector store
+    retrieve_response = await search_channel_messages(channel_id, request.query, request.limit, query_embedding)
+
+    if not retrieve_response.messages:
+        return PreparedCompletion(immediate=AssistantResponse(
+            response="No messages found in this channel.",
+            context_used=[],
+            confidence=0.0
+        ))
+
+    # Build context from messages
+    context = await assistant_manager.build_context(retrieve_response.messages)
+    
+    return PreparedCompletion(
+        site="summarize",
+        messages=[
+            {
+                "role": "system",
+                "content": f"""You are analyzing a chat channel. Your task is to provide a detailed response based on the channel's content.
 The query is: {request.query}
 
 Here is the relevant content from the channel:
@@ -469,87 +749,182 @@ Important:
 3. If answering a question, cite relevant messages
 4. Don't apologize or mention being an AI - just provide the information
 5. If the context seems insufficient, mention what additional information would be helpful"""
-                }
-            ],
-            temperature=0.3,  # Lower temperature for more factual responses
-            max_tokens=MAX_TOKENS
-        )
+            }
+        ],
+        temperature=0.3,  # Lower temperature for more factual responses
+        context_used=retrieve_response.messages,
+        # An answer to a question must never become the channel summary
+        after_complete=summary_saver(
+            channel_id,
+            latest_timestamp(retrieve_response.messages, request_start),
+            len(retrieve_response.messages)
+        ) if is_summary_query(request.query) else None
+    )
+
+async def prepare_summaries(request: BatchSummarizeRequest) -> List[Any]:
+    """Prepare summaries for many channels: one state fetch, one embedding call, concurrent retrievals.
+
+    Entries are PreparedCompletions, or the exception that prevented one.
+    """
+    channel_queries = {channel_id: request.queries.get(channel_id, request.query) for channel_id in request.channel_ids}
+    # Only plain summary requests may reuse a rolling summary; per-channel questions always retrieve
+    summary_channels = [channel_id for channel_id, query in channel_queries.items() if is_summary_query(query)]
+    states = await asyncio.to_thread(channel_summary_store.get_many, summary_channels) if summary_channels else {}
+
+    # Everything else needs retrieval; embed the distinct queries together
+    queries = {
+        channel_id: query for channel_id, query in channel_queries.items() if channel_id not in states
+    }
+    distinct = list(dict.fromkeys(queries.values()))
+    vectors = dict(zip(distinct, await embeddings.aembed_batch(distinct, "summarize"))) if distinct else {}
+
+    def prepare(channel_id: str) -> Awaitable[PreparedCompletion]:
+        if channel_id in states:
+            return prepare_rolling_summary(states[channel_id])
+        query = queries[channel_id]
+        return prepare_first_summary(channel_id, SummarizeRequest(query=query, limit=request.limit), vectors[query])
+
+    return await asyncio.gather(*(prepare(channel_id) for channel_id in request.channel_ids), return_exceptions=True)
+
+async def stream_summaries(channel_ids: List[str], prepared: List[Any]) -> AsyncIterator[str]:
+    """Emit a `summary` event per channel as soon as it is ready, then a `done` event with all results in order."""
+    semaphore = asyncio.Semaphore(SUMMARIZE_BATCH_CONCURRENCY)
+
+    async def run(index: int) -> Dict[str, Any]:
+        result = {"index": index, "channel_id": channel_ids[index]}
+        try:
+            if isinstance(prepared[index], Exception):
+                raise prepared[index]
+            async with semaphore:
+                response = await run_completion(prepared[index])
+            result.update(response.model_dump(mode="json"))
+        except Exception as e:
+            logging.error(f"Error summarizing channel {channel_ids[index]}: {str(e)}")
+            result["error"] = str(e)
+        return result
 
-        return AssistantResponse(
-            response=completion.choices[0].message.content,
-            context_used=retrieve_response.messages,
-            confidence=0.9
+    tasks = [asyncio.create_task(run(index)) for index in range(len(channel_ids))]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(tasks)
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            results[result["index"]] = result
+            yield sse_event("summary", result)
+        yield sse_event("done", {"results": results})
+    finally:
+        # The client went away; stop the remaining summaries
+        for task in tasks:
+            task.cancel()
+
+# Registered before /summarize/{channel_id} so "batch" is not taken for a channel ID
+@router.post("/summarize/batch")
+async def summarize_channels(request: BatchSummarizeRequest):
+    """Summarize many channels at once, streaming each summary as server-sent events."""
+    try:
+        prepared = await prepare_summaries(request)
+        return StreamingResponse(
+            stream_summaries(request.channel_ids, prepared),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
         )
 
+    except Exception as e:
+        logging.error(f"Error in batch summarize endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/summarize/{channel_id}", response_model=AssistantResponse)
+async def summarize_channel(
+    channel_id: str,
+    request: SummarizeRequest
+):
+    """Generate a summary or answer questions about a specific channel using vector search."""
+    try:
+        return await run_completion(await prepare_summary(channel_id, request))
+
     except Exception as e:
         logging.error(f"Error in summarize endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
 
-@router.post("/offline/{user_id}", response_model=AssistantResponse)
-async def get_offline_user_messages(
-    user_id: str,
-    request: OfflineRequest
+@router.post("/summarize/{channel_id}/stream")
+async def summarize_channel_stream(
+    channel_id: str,
+    request: SummarizeRequest
 ):
-    """Retrieve and analyze messages from a specific offline user."""
+    """Stream a channel summary as server-sent events."""
     try:
-        # Get messages from vector store with user-specific filter
-        retrieve_response = await retrieve_similar_user_messages(
-            UserMessagesRequest(user_id=user_id, top_k=request.limit)
-        )
+        return event_stream(await prepare_summary(channel_id, request))
 
-        if not retrieve_response.messages:
-            return AssistantResponse(
-                response=f"No messages found for this user.",
-                context_used=[],
-                confidence=0.0
-            )
+    except Exception as e:
+        logging.error(f"Error in summarize stream endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Build context from messages
-        context = await assistant_manager.build_context(retrieve_response.messages)
-        
-        # Get user info
-        prisma = get_prisma()
-        user = await prisma.user.find_unique(
-            where={"id": user_id}
-        )
-        username = user.username if user else "Unknown User"
-        
-        # Generate analysis/response
-        completion = await openai_client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"""You are analyzing messages from user {username}. Your task is to provide one response to {request.query} that sounds like them based on their message history.
+async def prepare_offline_reply(user_id: str, request: OfflineRequest) -> PreparedCompletion:
+    """Build the reply prompt for an offline user from their persona digest."""
+    digest = await assistant_manager.get_persona(user_id, request.limit)
 
-Here is their message history:
-{context}
+    if not digest:
+        return PreparedCompletion(immediate=AssistantResponse(
+            response=f"No messages found for this user.",
+            context_used=[],
+            confidence=0.0
+        ))
+
+    examples = "\n".join(f"- {example}" for example in digest.examples)
+    
+    return PreparedCompletion(
+        site="offline_reply",
+        messages=[
+            {
+                "role": "system",
+                "content": f"""You are writing a reply as user {digest.username}. Your task is to provide one response to {request.query} that sounds like them.
+
+Their communication style:
+{digest.style}
+
+Topics they often discuss: {", ".join(digest.topics) or "unknown"}
+
+Representative messages they have written:
+{examples}
 
 Important:
-1. Be specific and reference actual messages when possible
-2. Focus on patterns, preferences, and communication style
-3. If answering a specific question, cite relevant messages
-4. Don't apologize or mention being an AI - just provide the information
-5. If the context seems insufficient, mention what additional information would be helpful
-6. Do NOT mention the user's username in your response or the context to your message. Just generate a response that will be sent to the other user.
+1. Match their tone, vocabulary and typical phrasing
+2. Draw on their topics and messages when relevant to the question
+3. Don't apologize or mention being an AI - just provide the information
+4. Do NOT mention the user's username in your response or the context to your message. Just generate a response that will be sent to the other user.
 """
-                }
-            ],
-            temperature=0.3,  # Lower temperature for more factual responses
-            max_tokens=MAX_TOKENS
-        )
+            }
+        ],
+        temperature=0.3,  # Lower temperature for more factual responses
+        context_used=[]
+    )
 
-        return AssistantResponse(
-            response=completion.choices[0].message.content,
-            context_used=retrieve_response.messages,
-            confidence=0.9
-        )
+@router.post("/offline/{user_id}", response_model=AssistantResponse)
+async def get_offline_user_messages(
+    user_id: str,
+    request: OfflineRequest
+):
+    """Retrieve and analyze messages from a specific offline user."""
+    try:
+        return await run_completion(await prepare_offline_reply(user_id, request))
 
     except Exception as e:
         logging.error(f"Error in offline user endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
+
+@router.post("/offline/{user_id}/stream")
+async def get_offline_user_messages_stream(
+    user_id: str,
+    request: OfflineRequest
+):
+    """Stream an offline user's reply as server-sent events."""
+    try:
+        return event_stream(await prepare_offline_reply(user_id, request))
+
+    except Exception as e:
+        logging.error(f"Error in offline user stream endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/health")
 async def health_check():
     """Health check endpoint to verify service is running."""
-    return {"status": "healthy", "timestamp": str(datetime.now())}
\ No newline at end of file
+    return {"status": "healthy", "timestamp": str(datetime.now()), "llm": llm_stats(), "answer_cache": answer_cache.stats()}
\ No newline at end of file
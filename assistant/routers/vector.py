@@ -3,7 +3,6 @@ from typing import List, Dict, Any, Optional
 import os
 from dotenv import load_dotenv
 from pinecone import Pinecone, ServerlessSpec
-from langchain_openai import OpenAIEmbeddings
 from langchain_core.documents import Document
 from langchain_pinecone import PineconeVectorStore
 from constants import (
@@ -12,7 +11,10 @@ from constants import (
     SUMMARY_NAMESPACE,
     DOCUMENT_NAMESPACE,
     SUMMARY_THRESHOLD,
-    DEFAULT_TOP_K
+    DEFAULT_TOP_K,
+    MAX_EXPANDED_QUERIES,
+    RRF_K,
+    RETRIEVAL_DEFAULTS
 )
 from models import (
     Message, InitializeResponse, RetrieveRequest, RetrieveResponse,
@@ -22,9 +24,18 @@ import asyncio
 from langsmith import Client
 from langchain_core.tracers.context import tracing_v2_enabled
 from utils import get_prisma
-from openai import AsyncOpenAI
+from services.persona_digests import PersonaManager, PersonaDigestStore
+from services.llm import CoalescingOpenAI, openai_client, embeddings
+from services.answer_cache import answer_cache
+from services.deadline import run_stage
+from services.hot_index import hot_index
+from services.channel_router import ChannelRouter, ChannelCentroidStore
+from services.content_store import UPSERT_BATCH_SIZE
+from services.tokenizer import count_tokens_batch
 import json
 import logging
+import time
+import uuid
 
 # Load environment variables
 load_dotenv()
@@ -34,12 +45,11 @@ router = APIRouter()
 
 # Initialize components
 langsmith_client = Client()
+INITIALIZE_BATCH_SIZE = 256  # Messages embedded per call when rebuilding the index
 pc = Pinecone(
     api_key=os.getenv("PINECONE_API_KEY"),
     environment=os.getenv("PINECONE_ENVIRONMENT", "gcp-starter")
 )
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 class VectorStoreManager:
     def __init__(self):
@@ -60,32 +70,126 @@ class VectorStoreManager:
 
     async def search_chat_messages(self, query: str, top_k: int, filter_dict: Dict) -> List[tuple]:
         """Search for similar chat messages."""
-        return self.chat_store.similarity_search_with_score(
-            query,
+        # Embedded through the governed async path; the store's own sync embedding would bypass it
+        embedding = await embeddings.aembed_query(query)
+        return await self.search_chat_messages_by_vector(embedding, top_k, filter_dict)
+
+    async def search_chat_messages_by_vector(self, embedding: List[float], top_k: int, filter_dict: Dict) -> List[tuple]:
+        """Search for similar chat messages with a precomputed query embedding."""
+        return await asyncio.to_thread(
+            self.chat_store.similarity_search_by_vector_with_score,
+            embedding,
             k=top_k,
             filter=filter_dict
         )
 
-    async def search_document_summaries(self, query: str) -> List[tuple]:
+    async def search_document_summaries(self, embedding: List[float]) -> List[tuple]:
         """Search for relevant document summaries."""
-        return self.summary_store.similarity_search_with_score(
-            query,
+        return await asyncio.to_thread(
+            self.summary_store.similarity_search_by_vector_with_score,
+            embedding,
             k=DEFAULT_TOP_K
         )
 
-    async def search_document_chunks(self, file_id: str) -> List[tuple]:
-        """Search for document chunks by file ID."""
-        return self.doc_store.similarity_search_with_score(
-            "",  # Empty query since we're using filter
-            k=50,  # Get more chunks to ensure we have full context
+    async def search_document_chunks(self, file_id: str, embedding: List[float], k: int) -> List[tuple]:
+        """Search for document chunks by file ID, closest to the query first."""
+        return await asyncio.to_thread(
+            self.doc_store.similarity_search_by_vector_with_score,
+            embedding,
+            k=k,
             filter={
                 "file_id": file_id,
                 "source_type": "document"
             }
         )
 
+def fuse_results(result_lists: List[List[tuple]], top_k: int) -> List[tuple]:
+    """Reciprocal-rank fusion of several (doc, score) lists, keeping each document's best score."""
+    fused: Dict[Any, float] = {}
+    best: Dict[Any, tuple] = {}
+    for results in result_lists:
+        for rank, (doc, score) in enumerate(results):
+            key = doc.metadata.get("message_id") or (doc.metadata.get("channel_id"), doc.page_content)
+            fused[key] = fused.get(key, 0) + 1 / (RRF_K + rank + 1)
+            if key not in best or score > best[key][1]:
+                best[key] = (doc, score)
+    ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [best[key] for key in ranked]
+
+def retrieval_settings(request: RetrieveRequest) -> Dict[str, Any]:
+    """Adaptive retrieval settings for the request's channel type; explicit top_k and threshold win."""
+    settings = dict(RETRIEVAL_DEFAULTS.get(request.channel_type, RETRIEVAL_DEFAULTS[CHANNEL_TYPES['PUBLIC']]))
+    if request.top_k is not None:
+        settings['max_k'] = request.top_k
+        settings['initial_k'] = min(settings['initial_k'], request.top_k)
+        settings['min_k'] = min(settings['min_k'], request.top_k)
+    if request.threshold is not None:
+        settings['threshold'] = request.threshold
+    return settings
+
+def adaptive_cutoff(results: List[tuple], settings: Dict[str, Any]) -> int:
+    """How many of the score-sorted results to keep.
+
+    Stops below the threshold, at the first score cliff once min_k results are
+    in, or when the retrieved text would exceed the context budget.
+    """
+    token_counts = count_tokens_batch([doc.page_content for doc, _ in results])
+    keep = 0
+    tokens = 0
+    for index, ((_, score), doc_tokens) in enumerate(zip(results, token_counts)):
+        if score < settings['threshold']:
+            break
+        if index >= settings['min_k']:
+            if results[index - 1][1] - score > settings['max_gap']:
+                break
+            if tokens + doc_tokens > settings['context_tokens']:
+                break
+        keep = index + 1
+        tokens += doc_tokens
+    return keep
+
+async def adaptive_chat_search(query_vectors: List[List[float]], filter_dict: Dict, settings: Dict[str, Any], needs_history: bool = False) -> List[tuple]:
+    """Search the hot tier, then Pinecone when that is not enough.
+
+    Recent messages answer on their own when at least min_k of them survive
+    the cutoff and the query is not about older history. Otherwise Pinecone
+    candidates are fetched progressively, doubling k until a cutoff is found
+    inside the results, and fused with the hot ones.
+    """
+    # The hot tier's matrix search is CPU-bound; keep it off the event loop
+    hot_lists = await asyncio.to_thread(
+        lambda: [hot_index.search(vector, settings['max_k'], filter_dict) for vector in query_vectors]
+    )
+    if not needs_history:
+        hot_results = sorted(fuse_results(hot_lists, settings['max_k']), key=lambda result: result[1], reverse=True)
+        keep = adaptive_cutoff(hot_results, settings)
+        if keep >= settings['min_k']:
+            return hot_results[:keep]
+
+    k = settings['initial_k']
+    while True:
+        result_lists = await asyncio.gather(*(
+            vector_store_manager.search_chat_messages_by_vector(vector, k, filter_dict)
+            for vector in query_vectors
+        ))
+        candidates = sorted(fuse_results(hot_lists + list(result_lists), k), key=lambda result: result[1], reverse=True)
+        keep = adaptive_cutoff(candidates, settings)
+        # Done when something was cut, the index ran out of matches, or k is at its cap
+        if keep < len(candidates) or len(candidates) < k or k >= settings['max_k']:
+            return candidates[:keep]
+        k = min(k * 2, settings['max_k'])
+
+async def routed_chat_search(query_vectors: List[List[float]], filter_dict: Dict, channels: List[str], settings: Dict[str, Any], needs_history: bool = False) -> List[tuple]:
+    """Search within the routed channels, widening to every readable channel when they yield too little."""
+    if channels:
+        routed_filter = {"$and": [filter_dict, {"channel_id": {"$in": channels}}]}
+        results = await adaptive_chat_search(query_vectors, routed_filter, settings, needs_history)
+        if len(results) >= settings['min_k']:
+            return results
+    return await adaptive_chat_search(query_vectors, filter_dict, settings, needs_history)
+
 class QueryAnalyzer:
-    def __init__(self, client: AsyncOpenAI):
+    def __init__(self, client: CoalescingOpenAI):
         self.client = client
 
     async def analyze_query(self, query: str, requesting_username: str) -> Dict:
@@ -94,6 +198,7 @@ class QueryAnalyzer:
         1. Is this a request that would benefit from user preferences or past history?
         2. What type of preferences or history would be relevant?
         3. Should we look for specific user information?
+        4. Does it ask about anything older than the last few days?
 
         Query: {query}
         Current user: {requesting_username}
@@ -104,12 +209,13 @@ class QueryAnalyzer:
             "preference_types": list[string],
             "is_user_specific": boolean,
             "target_user": string or null,
-            "search_queries": list[string]
+            "search_queries": list[string],
+            "needs_older_history": boolean
         }}
         """
 
-        completion = await self.client.chat.completions.create(
-            model="gpt-4-turbo-preview",
+        completion = await self.client.complete(
+            "query_analysis",
             messages=[
                 {"role": "system", "content": "You analyze queries to determine what user preferences or history would be relevant. Be thorough in identifying opportunities to personalize responses."},
                 {"role": "user", "content": analysis_prompt}
@@ -164,7 +270,8 @@ class ResultFormatter:
                 channel_name=doc.metadata.get("channel_name", "Unknown"),
                 sender_name=doc.metadata.get("sender_name", "Unknown"),
                 content=doc.page_content,
-                similarity=score
+                similarity=score,
+                metadata={"timestamp": doc.metadata["timestamp"]} if "timestamp" in doc.metadata else None
             )
         except Exception as e:
             logging.error(f"Error formatting chat result: {str(e)}")
@@ -196,9 +303,21 @@ class ResultFormatter:
             logging.error(f"Error formatting document result: {str(e)}")
             return None
 
+# Used when the analyzer is skipped to meet a deadline
+DEFAULT_QUERY_ANALYSIS = {
+    "needs_preferences": False,
+    "preference_types": [],
+    "is_user_specific": False,
+    "target_user": None,
+    "search_queries": [],
+    "needs_older_history": False
+}
+
 # Initialize managers and services
 vector_store_manager = VectorStoreManager()
 query_analyzer = QueryAnalyzer(openai_client)
+persona_manager = PersonaManager(openai_client, embeddings, PersonaDigestStore(pc.Index(CHAT_INDEX_NAME)))
+channel_router = ChannelRouter(ChannelCentroidStore(pc.Index(CHAT_INDEX_NAME)))
 
 @router.post("/retrieve", response_model=RetrieveResponse)
 async def retrieve_similar_messages(request: RetrieveRequest):
@@ -215,7 +334,11 @@ async def retrieve_similar_messages(request: RetrieveRequest):
             requesting_username = user.username if user else None
             
             # Analyze query for user context
-            analysis = await query_analyzer.analyze_query(request.query, requesting_username)
+            analysis = await run_stage(
+                "query_analysis",
+                lambda: query_analyzer.analyze_query(request.query, requesting_username),
+                DEFAULT_QUERY_ANALYSIS
+            )
             is_user_specific = analysis["is_user_specific"]
             target_username = analysis["target_user"]
             
@@ -229,39 +352,66 @@ async def retrieve_similar_messages(request: RetrieveRequest):
                 request.user_id if is_user_specific else None
             )
             
-            # Search for relevant content
-            chat_results = await vector_store_manager.search_chat_messages(
-                request.query,
-                request.top_k,
-                filter_dict
+            # Embed the query and the analyzer's expansions in one call, skipping a query embedding the caller passed in
+            queries = [request.query]
+            if request.multi_query:
+                expansions = [query for query in analysis.get("search_queries") or [] if query and query != request.query]
+                queries += expansions[:MAX_EXPANDED_QUERIES]
+            if request.query_embedding:
+                expanded = await embeddings.aembed_batch(queries[1:], "chat") if len(queries) > 1 else []
+                query_vectors = [request.query_embedding] + expanded
+            else:
+                query_vectors = await embeddings.aembed_batch(queries, "chat")
+            
+            # Assistant-channel queries span every readable channel; search only the closest few
+            channels = []
+            if request.channel_type == CHANNEL_TYPES['ASSISTANT']:
+                channels = await run_stage(
+                    "channel_routing",
+                    lambda: channel_router.route(query_vectors[0], request.user_id),
+                    []
+                )
+            
+            # Search every query plus the document summaries concurrently
+            settings = retrieval_settings(request)
+            chat_results, summary_results = await asyncio.gather(
+                run_stage(
+                    "chat_search",
+                    lambda: routed_chat_search(query_vectors, filter_dict, channels, settings, bool(analysis.get("needs_older_history"))),
+                    []
+                ),
+                run_stage(
+                    "document_search",
+                    lambda: vector_store_manager.search_document_summaries(query_vectors[0]),
+                    []
+                )
             )
-
-        
-            summary_results = await vector_store_manager.search_document_summaries(request.query)
             
             # Process results
             messages = []
             
-            # Process chat results
+            # Process chat results (already cut to the relevant ones)
             for doc, score in chat_results:
-                if score < request.threshold:
-                    continue
                 if msg := ResultFormatter.format_chat_result(doc, score):
                     messages.append(msg)
             
-            # Process document results
-            for summary_doc, summary_score in summary_results:
-                if summary_score < SUMMARY_THRESHOLD:
-                    continue
-                
-                if "file_id" in summary_doc.metadata:
-                    file_docs = await vector_store_manager.search_document_chunks(
-                        summary_doc.metadata["file_id"]
-                    )
-                    
-                    for doc, _ in file_docs:
-                        if msg := ResultFormatter.format_document_result(doc, summary_score):
-                            messages.append(msg)
+            # Process document results, expanding every matched file concurrently
+            matched = [
+                (summary_doc, summary_score) for summary_doc, summary_score in summary_results
+                if summary_score >= SUMMARY_THRESHOLD and "file_id" in summary_doc.metadata
+            ]
+            file_chunks = await asyncio.gather(*(
+                run_stage(
+                    "document_chunks",
+                    lambda file_id=summary_doc.metadata["file_id"]: vector_store_manager.search_document_chunks(file_id, query_vectors[0], settings['chunk_k']),
+                    []
+                )
+                for summary_doc, _ in matched
+            ))
+            for (_, summary_score), file_docs in zip(matched, file_chunks):
+                for doc, _ in file_docs[:adaptive_cutoff(file_docs, {**settings, 'threshold': 0})]:
+                    if msg := ResultFormatter.format_document_result(doc, summary_score):
+                        messages.append(msg)
             
             # Sort results by similarity
             messages.sort(key=lambda x: x.similarity, reverse=True)
@@ -331,15 +481,29 @@ async def initialize_vector_db():
                     "channel_type": "private" if msg.channel.isPrivate else "public",
                     "sender_name": msg.user.username,
                     "thread_id": str(msg.threadId) if msg.threadId else "",
-                    "user_id": str(msg.userId)
+                    "user_id": str(msg.userId),
+                    "timestamp": msg.createdAt.timestamp()
                 }
             )
             documents.append(doc)
             vectors_created += 1
             
-        # Add documents to vector store
-        if documents:
-            vector_store_manager.chat_store.add_documents(documents)
+        # Embed in batches at ingestion priority so a reindex yields to live traffic
+        index = pc.Index(CHAT_INDEX_NAME)
+        centroids = {}
+        for start in range(0, len(documents), INITIALIZE_BATCH_SIZE):
+            batch = documents[start:start + INITIALIZE_BATCH_SIZE]
+            vectors = await embeddings.aembed_documents([doc.page_content for doc in batch])
+            for doc, values in zip(batch, vectors):
+                ChannelRouter.accumulate(centroids, doc.metadata, values)
+            records = [
+                (str(uuid.uuid4()), values, {**doc.metadata, "text": doc.page_content})
+                for doc, values in zip(batch, vectors)
+            ]
+            # Upserts stay under Pinecone's request size limit
+            for offset in range(0, len(records), UPSERT_BATCH_SIZE):
+                await asyncio.to_thread(index.upsert, vectors=records[offset:offset + UPSERT_BATCH_SIZE])
+        await asyncio.to_thread(channel_router.rebuild, centroids)
             
         return InitializeResponse(
             message="Vector database initialized successfully",
@@ -366,11 +530,25 @@ async def update_vector_db(request: VectorUpdateRequest):
                 "channel_id": request.channel_id,
                 "channel_type": request.channel_type,
                 "user_id": request.user_id,
-                "sender_name": request.sender_name
+                "sender_name": request.sender_name,
+                "message_id": request.message_id,
+                "timestamp": time.time()
             }
         )
         
-        await vector_store_manager.chat_store.aadd_documents([doc])
+        # Embed once for both tiers at chat priority, so live messages never queue behind a reindex;
+        # the hot tier makes the message searchable before Pinecone indexes it
+        vector = (await embeddings.aembed_batch([request.content], "chat"))[0]
+        hot_index.add(doc, vector)
+        channel_router.observe(doc.metadata, vector)
+        await asyncio.to_thread(
+            pc.Index(CHAT_INDEX_NAME).upsert,
+            vectors=[(str(uuid.uuid4()), vector, {**doc.metadata, "text": doc.page_content})]
+        )
+        persona_manager.observe(request.user_id, request.sender_name, request.content)
+        if "@assistant" not in request.content:
+            # Questions to the assistant are not new knowledge; don't let them evict the answers they are asking for
+            answer_cache.invalidate_message(request.channel_id, request.channel_type, request.user_id)
         return {"status": "success"}
             
     except ValueError as e:
@@ -395,10 +573,25 @@ async def update_vector_db(request: VectorUpdateRequest):
         }
 
 @router.post("/delete")
-async def delete_from_vector_db(message_id: str = Body(..., embed=True)):
-    """Delete a message from the vector database."""
+async def delete_from_vector_db(
+    message_id: str = Body(..., embed=True),
+    channel_id: Optional[str] = Body(None),
+    channel_type: Optional[str] = Body(None),
+    user_id: Optional[str] = Body(None)
+):
+    """Delete a message from the vector database, the hot tier and the answers built on it."""
     try:
         vector_store_manager.chat_store.delete({"message_id": message_id})
+        hot = hot_index.remove(message_id)
+        if hot:
+            channel_id = hot.metadata["channel_id"]
+            channel_type = hot.metadata["channel_type"]
+            user_id = hot.metadata["user_id"]
+        if channel_id and channel_type and user_id:
+            answer_cache.invalidate_message(channel_id, channel_type, user_id)
+        else:
+            # Without the message's channel, any cached answer may cite it
+            answer_cache.clear()
         return {"message": "Vector deleted successfully"}
             
     except Exception as e:
@@ -415,13 +608,40 @@ async def get_index_stats():
             "status": "ok",
             "index_name": CHAT_INDEX_NAME,
             "total_vectors": stats.get("total_vector_count", 0),
-            "dimension": stats.get("dimension", 1536)
+            "dimension": stats.get("dimension", 1536),
+            "hot_tier": hot_index.stats()
         }
             
     except Exception as e:
         logging.error(f"Error getting index stats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def search_channel_messages(channel_id: str, query: str, top_k: int, embedding: List[float]) -> RetrieveResponse:
+    """Retrieve messages from a channel with a precomputed query embedding."""
+    # Use FilterBuilder for consistent filtering
+    filter_dict = FilterBuilder.build_filter(
+        channel_id=channel_id,
+        channel_type="public"
+    )
+
+    # Search for content
+    chat_results = await vector_store_manager.search_chat_messages_by_vector(
+        embedding,
+        top_k,
+        filter_dict
+    )
+    
+    # Process results
+    messages = []
+    for doc, score in chat_results:
+        if msg := ResultFormatter.format_chat_result(doc, score):
+            messages.append(msg)
+    
+    return RetrieveResponse(
+        query=query,
+        messages=messages
+    )
+
 # Used for summarization and channel-specific search
 @router.post("/retrieve/channel", response_model=RetrieveResponse)
 async def retrieve_similar_channel_messages(request: ChannelMessagesRequest):
@@ -429,31 +649,8 @@ async def retrieve_similar_channel_messages(request: ChannelMessagesRequest):
     try:
         with tracing_v2_enabled():
             logging.info(f"Retrieving messages for channel: {request.channel_id}")
-            
-            
-            # Use FilterBuilder for consistent filtering
-            filter_dict = FilterBuilder.build_filter(
-                channel_id=request.channel_id,
-                channel_type="public"
-            )
-
-            # Search for content
-            chat_results = await vector_store_manager.search_chat_messages(
-                request.query,
-                request.top_k,
-                filter_dict
-            )
-            
-            # Process results
-            messages = []
-            for doc, score in chat_results:
-                if msg := ResultFormatter.format_chat_result(doc, score):
-                    messages.append(msg)
-            
-            return RetrieveResponse(
-                query=request.query,
-                messages=messages
-            )
+            embedding = await embeddings.aembed_query(request.query)
+            return await search_channel_messages(request.channel_id, request.query, request.top_k, embedding)
                 
     except Exception as e:
         logging.error(f"Error retrieving channel messages: {str(e)}")
@@ -0,0 +1,153 @@
+import time
+from typing import Dict, List, Optional, Set
+import numpy as np
+from pydantic import BaseModel, ConfigDict
+from constants import (
+    CHANNEL_TYPES,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_SIZE
+)
+from models import AssistantResponse
+
+DOCUMENTS_TAG = "documents"
+PUBLIC_TAG = "public"
+
+
+class CachedAnswer(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    question: str
+    embedding: np.ndarray  # Unit-normalized question embedding
+    response: AssistantResponse
+    depends_on: Set[str]
+    created_at: float
+
+
+def answer_scope(channel_type: str, channel_id: str, user_id: str) -> str:
+    """Cache scope mirroring FilterBuilder: answers are only shared between askers who see the same messages."""
+    if channel_type in [CHANNEL_TYPES['PUBLIC'], CHANNEL_TYPES['PRIVATE']]:
+        return f"channel:{channel_id}"
+    return f"{channel_type}:{channel_id}:{user_id}"
+
+
+def answer_dependencies(channel_type: str, channel_id: str, user_id: str) -> Set[str]:
+    """Invalidation tags for an answer: the messages its retrieval could have seen, plus every document."""
+    if channel_type in [CHANNEL_TYPES['PUBLIC'], CHANNEL_TYPES['PRIVATE']]:
+        return {f"channel:{channel_id}", DOCUMENTS_TAG}
+    if channel_type == CHANNEL_TYPES['ASSISTANT']:
+        return {PUBLIC_TAG, f"user:{user_id}", DOCUMENTS_TAG}
+    return {f"channel:{channel_id}", f"user:{user_id}", DOCUMENTS_TAG}
+
+
+def message_tags(channel_id: str, channel_type: str, user_id: str) -> Set[str]:
+    """Tags touched by a new chat message."""
+    tags = {f"channel:{channel_id}", f"user:{user_id}"}
+    if channel_type == CHANNEL_TYPES['PUBLIC']:
+        tags.add(PUBLIC_TAG)
+    return tags
+
+
+class AnswerCache:
+    """In-process semantic cache of /assistant/chat answers.
+
+    Questions are matched by cosine similarity of their embeddings within one
+    access scope. New messages and documents invalidate the entries whose
+    retrieval could have included them; answers computed while such an
+    update landed are not stored.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: float = ANSWER_CACHE_TTL,
+        max_entries: int = ANSWER_CACHE_SIZE
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: Dict[str, List[CachedAnswer]] = {}
+        self.invalidated_at: Dict[str, float] = {}
+        self.cleared_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, scope: str, embedding: List[float]) -> Optional[AssistantResponse]:
+        """Return the cached answer closest to the question, if it is close enough."""
+        now = time.time()
+        entries = [entry for entry in self.entries.get(scope, []) if now - entry.created_at < self.ttl]
+        self.entries[scope] = entries
+        if not entries:
+            self.misses += 1
+            return None
+
+        similarities = np.stack([entry.embedding for entry in entries]) @ self._normalize(embedding)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entries[best].response
+
+    def put(self, scope: str, question: str, embedding: List[float], response: AssistantResponse, depends_on: Set[str], started_at: float):
+        """Store an answer unless something it depends on changed since started_at."""
+        if self.cleared_at >= started_at or any(self.invalidated_at.get(tag, 0) >= started_at for tag in depends_on):
+            return
+        entries = self.entries.setdefault(scope, [])
+        entries.append(CachedAnswer(
+            question=question,
+            embedding=self._normalize(embedding),
+            response=response,
+            depends_on=depends_on,
+            created_at=time.time()
+        ))
+        self._evict()
+
+    def _evict(self):
+        total = sum(len(entries) for entries in self.entries.values())
+        if total <= self.max_entries:
+            return
+        # Drop the oldest entries across every scope
+        ordered = sorted(
+            ((entry.created_at, scope) for scope, entries in self.entries.items() for entry in entries)
+        )
+        cutoff = ordered[total - self.max_entries - 1][0]
+        for scope in list(self.entries):
+            self.entries[scope] = [entry for entry in self.entries[scope] if entry.created_at > cutoff]
+
+    def invalidate(self, tags: Set[str]):
+        """Drop every answer depending on any of the tags."""
+        now = time.time()
+        for tag in tags:
+            self.invalidated_at[tag] = now
+        for scope in list(self.entries):
+            self.entries[scope] = [entry for entry in self.entries[scope] if not entry.depends_on & tags]
+
+    def invalidate_message(self, channel_id: str, channel_type: str, user_id: str):
+        self.invalidate(message_tags(channel_id, channel_type, user_id))
+
+    def clear(self):
+        """Drop every cached answer, for changes that cannot be attributed to a channel."""
+        self.cleared_at = time.time()
+        self.entries.clear()
+
+    def invalidate_documents(self):
+        # Document summaries are searched from every channel
+        self.invalidate({DOCUMENTS_TAG})
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": sum(len(entries) for entries in self.entries.values()),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+# Shared by the chat endpoint and the routers that ingest new content
+answer_cache = AnswerCache()
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from pydantic import BaseModel, ConfigDict
+from constants import (
+    CHANNEL_TYPES,
+    CHANNEL_CENTROID_NAMESPACE,
+    CHANNEL_CENTROID_BATCH,
+    CHANNEL_CENTROID_MAX_USERS,
+    CHANNEL_ROUTING_TOP_N
+)
+
+
+class ChannelCentroid(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    channel_id: str
+    channel_type: str
+    channel_name: str = ""
+    centroid: np.ndarray  # Mean embedding of the channel's messages
+    message_count: int = 0
+    user_ids: List[str] = []  # Recent posters in non-public channels, newest first, for access filtering
+    updated_at: float = 0
+
+
+class ChannelCentroidStore:
+    """Per-channel centroid embeddings persisted in their own namespace of the chat index (ID = channel_id)."""
+
+    def __init__(self, index, namespace: str = CHANNEL_CENTROID_NAMESPACE):
+        self.index = index
+        self.namespace = namespace
+
+    def get(self, channel_id: str) -> Optional[ChannelCentroid]:
+        try:
+            response = self.index.fetch(ids=[channel_id], namespace=self.namespace)
+        except Exception as e:
+            logging.error(f"Error fetching channel centroid: {str(e)}")
+            return None
+        vector = (response.vectors or {}).get(channel_id)
+        if not vector:
+            return None
+        metadata = vector.metadata or {}
+        return ChannelCentroid(
+            channel_id=channel_id,
+            channel_type=metadata.get("channel_type", CHANNEL_TYPES['PUBLIC']),
+            channel_name=metadata.get("channel_name", ""),
+            centroid=np.asarray(vector.values, dtype=np.float32),
+            message_count=int(metadata.get("message_count", 0)),
+            user_ids=list(metadata.get("user_ids", [])),
+            updated_at=float(metadata.get("updated_at", 0))
+        )
+
+    def put_many(self, centroids: List[ChannelCentroid]):
+        try:
+            self.index.upsert(
+                vectors=[
+                    (
+                        centroid.channel_id,
+                        centroid.centroid.tolist(),
+                        {
+                            "channel_type": centroid.channel_type,
+                            "channel_name": centroid.channel_name,
+                            "message_count": centroid.message_count,
+                            "user_ids": centroid.user_ids,
+                            "updated_at": centroid.updated_at
+                        }
+                    )
+                    for centroid in centroids
+                ],
+                namespace=self.namespace
+            )
+        except Exception as e:
+            logging.error(f"Error storing channel centroids: {str(e)}")
+
+    def query(self, embedding: List[float], top_k: int, user_id: Optional[str]) -> List[Tuple[str, float]]:
+        """(channel_id, score) of the channels closest to the embedding among those the user can read, best first."""
+        access = [{"channel_type": {"$eq": CHANNEL_TYPES['PUBLIC']}}]
+        if user_id:
+            access.append({"user_ids": {"$in": [user_id]}})
+        try:
+            response = self.index.query(
+                vector=embedding,
+                top_k=top_k,
+                filter={"$or": access},
+                namespace=self.namespace
+            )
+        except Exception as e:
+            logging.error(f"Error querying channel centroids: {str(e)}")
+            return []
+        return [(match.id, match.score) for match in response.matches]
+
+
+class PendingCentroid(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    channel_type: str
+    channel_name: str = ""
+    total: np.ndarray  # Sum of the buffered message embeddings
+    count: int = 0
+    user_ids: Set[str] = set()
+
+
+class ChannelRouter:
+    """Routes assistant-channel queries to the few channels most likely to answer them.
+
+    Every channel has a centroid: the mean embedding of its messages.
+    /vector/update folds new message vectors into a per-channel running sum;
+    once CHANNEL_CENTROID_BATCH have accumulated, a background flush merges
+    them into the stored centroid. A query then searches the centroids first
+    and the messages only within the top channels.
+    """
+
+    def __init__(self, store: ChannelCentroidStore, top_n: int = CHANNEL_ROUTING_TOP_N, batch: int = CHANNEL_CENTROID_BATCH):
+        self.store = store
+        self.top_n = top_n
+        self.batch = batch
+        self.pending: Dict[str, PendingCentroid] = {}
+        self.flushing: Set[str] = set()
+        self.tasks: Set[asyncio.Task] = set()  # Background flushes, kept alive until they finish
+
+    @staticmethod
+    def accumulate(pending: Dict[str, PendingCentroid], metadata: Dict, embedding: List[float]) -> PendingCentroid:
+        """Add one message vector to its channel's running sum."""
+        channel = pending.get(metadata["channel_id"])
+        if channel is None:
+            channel = PendingCentroid(
+                channel_type=metadata["channel_type"],
+                total=np.zeros(len(embedding), dtype=np.float32)
+            )
+            pending[metadata["channel_id"]] = channel
+        channel.channel_name = metadata.get("channel_name") or channel.channel_name
+        channel.total += np.asarray(embedding, dtype=np.float32)
+        channel.count += 1
+        if metadata["channel_type"] != CHANNEL_TYPES['PUBLIC']:
+            channel.user_ids.add(metadata["user_id"])
+        return channel
+
+    def observe(self, metadata: Dict, embedding: List[float]):
+        """Buffer a new message vector and schedule a flush once the channel's batch is full."""
+        channel_id = metadata["channel_id"]
+        pending = self.accumulate(self.pending, metadata, embedding)
+        if pending.count >= self.batch and channel_id not in self.flushing:
+            task = asyncio.create_task(self.flush(channel_id))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def flush(self, channel_id: str):
+        """Merge a channel's buffered vectors into its stored centroid."""
+        pending = self.pending.pop(channel_id, None)
+        if pending is None:
+            return
+        self.flushing.add(channel_id)
+        try:
+            current = await asyncio.to_thread(self.store.get, channel_id)
+            await asyncio.to_thread(self.store.put_many, [self.merge(channel_id, current, pending)])
+        except Exception as e:
+            logging.error(f"Error updating channel centroid: {str(e)}")
+        finally:
+            self.flushing.discard(channel_id)
+
+    @staticmethod
+    def merge(channel_id: str, current: Optional[ChannelCentroid], pending: PendingCentroid) -> ChannelCentroid:
+        count = (current.message_count if current else 0) + pending.count
+        total = pending.total + (current.centroid * current.message_count if current else 0)
+        return ChannelCentroid(
+            channel_id=channel_id,
+            channel_type=pending.channel_type,
+            channel_name=pending.channel_name or (current.channel_name if current else ""),
+            centroid=total / count,
+            message_count=count,
+            # Newest posters first; one dropped by the cap is no longer routed here, though retrieval filters are unchanged
+            user_ids=(sorted(pending.user_ids) + [
+                user_id for user_id in (current.user_ids if current else []) if user_id not in pending.user_ids
+            ])[:CHANNEL_CENTROID_MAX_USERS],
+            updated_at=time.time()
+        )
+
+    def rebuild(self, pending: Dict[str, PendingCentroid]):
+        """Store centroids computed from scratch (see accumulate), as /vector/initialize does."""
+        self.pending.clear()
+        centroids = [self.merge(channel_id, None, channel) for channel_id, channel in pending.items()]
+        for start in range(0, len(centroids), 100):
+            self.store.put_many(centroids[start:start + 100])
+
+    def pending_scores(self, embedding: List[float], user_id: Optional[str]) -> List[Tuple[str, float]]:
+        """Score the not yet flushed buffers, so new and quiet channels can still be routed to."""
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = []
+        for channel_id, pending in list(self.pending.items()):
+            if pending.channel_type != CHANNEL_TYPES['PUBLIC'] and user_id not in pending.user_ids:
+                continue
+            scores.append((channel_id, float(pending.total @ query / (np.linalg.norm(pending.total) or 1.0))))
+        return scores
+
+    async def route(self, embedding: List[float], user_id: Optional[str]) -> List[str]:
+        """The top_n channels for a query, or [] when the user cannot read more than that anyway."""
+        stored = await asyncio.to_thread(self.store.query, embedding, self.top_n + 1, user_id)
+        best: Dict[str, float] = {}
+        for channel_id, score in stored + self.pending_scores(embedding, user_id):
+            best[channel_id] = max(score, best.get(channel_id, score))
+        if len(best) <= self.top_n:
+            return []
+        return sorted(best, key=best.get, reverse=True)[:self.top_n]
@@ -0,0 +1,115 @@
+import logging
+import time
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+from constants import CHANNEL_SUMMARY_NAMESPACE
+from models import Message
+
+
+class ChannelSummaryState(BaseModel):
+    channel_id: str
+    summary: str
+    embedding: List[float]
+    watermark: float  # Timestamp of the newest message folded into the summary
+    message_count: int
+    updated_at: float
+
+
+class ChannelSummaryStore:
+    """Rolling per-channel summaries persisted in their own namespace of the chat index.
+
+    Each channel has one vector (ID = channel_id) whose values are the summary
+    embedding and whose metadata carries the summary text and the message
+    high-watermark. The summary embedding doubles as the query vector when
+    looking for messages newer than the watermark, so checking for changes
+    costs no embedding call.
+    """
+
+    def __init__(self, index, namespace: str = CHANNEL_SUMMARY_NAMESPACE, messages_namespace: str = ""):
+        self.index = index
+        self.namespace = namespace
+        self.messages_namespace = messages_namespace
+
+    def get(self, channel_id: str) -> Optional[ChannelSummaryState]:
+        """Load the stored summary state for a channel."""
+        return self.get_many([channel_id]).get(channel_id)
+
+    def get_many(self, channel_ids: List[str]) -> Dict[str, ChannelSummaryState]:
+        """Load the stored summary states for several channels in one fetch."""
+        try:
+            response = self.index.fetch(ids=list(dict.fromkeys(channel_ids)), namespace=self.namespace)
+        except Exception as e:
+            logging.error(f"Error fetching channel summary: {str(e)}")
+            return {}
+        return {
+            channel_id: self._state(channel_id, vector)
+            for channel_id, vector in (response.vectors or {}).items()
+        }
+
+    @staticmethod
+    def _state(channel_id: str, vector) -> ChannelSummaryState:
+        metadata = vector.metadata or {}
+        return ChannelSummaryState(
+            channel_id=channel_id,
+            summary=metadata.get("text", ""),
+            embedding=list(vector.values),
+            watermark=float(metadata.get("watermark", 0)),
+            message_count=int(metadata.get("message_count", 0)),
+            updated_at=float(metadata.get("updated_at", 0))
+        )
+
+    def put(self, state: ChannelSummaryState):
+        """Persist a channel's summary state."""
+        try:
+            self.index.upsert(
+                vectors=[(
+                    state.channel_id,
+                    state.embedding,
+                    {
+                        "text": state.summary,
+                        "watermark": state.watermark,
+                        "message_count": state.message_count,
+                        "updated_at": state.updated_at
+                    }
+                )],
+                namespace=self.namespace
+            )
+        except Exception as e:
+            logging.error(f"Error storing channel summary: {str(e)}")
+
+    def new_messages(self, state: ChannelSummaryState, limit: int) -> List[Message]:
+        """Return messages posted after the watermark, oldest first."""
+        response = self.index.query(
+            vector=state.embedding,
+            top_k=limit,
+            filter={
+                "channel_id": {"$eq": state.channel_id},
+                "timestamp": {"$gt": state.watermark}
+            },
+            include_metadata=True,
+            namespace=self.messages_namespace
+        )
+        if len(response.matches) >= limit:
+            logging.warning(f"Channel {state.channel_id} has more than {limit} new messages; folding the closest {limit}")
+
+        messages = []
+        for match in response.matches:
+            metadata = match.metadata or {}
+            messages.append(Message(
+                message_id=metadata.get("message_id", match.id),
+                channel_name=metadata.get("channel_name", "Unknown"),
+                sender_name=metadata.get("sender_name", "Unknown"),
+                content=metadata.get("text", ""),
+                similarity=match.score,
+                metadata={"timestamp": metadata.get("timestamp", 0)}
+            ))
+        messages.sort(key=lambda msg: msg.metadata["timestamp"])
+        return messages
+
+
+def latest_timestamp(messages: List[Message], default: Optional[float] = None) -> float:
+    """Newest message timestamp, falling back to default (or now) when none carry one."""
+    timestamps = [msg.metadata["timestamp"] for msg in messages if msg.metadata and "timestamp" in msg.metadata]
+    if timestamps:
+        return max(timestamps)
+    return default if default is not None else time.time()
@@ -0,0 +1,115 @@
+import re
+import zlib
+from typing import List, Tuple
+import numpy as np
+from models import Message
+from services.tokenizer import count_tokens_batch
+
+HASH_BUCKETS = 4096
+DENSE_WEIGHT = 0.5  # Share of a sentence's score taken from its source's retrieval similarity
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+WORD_PATTERN = re.compile(r"[a-z0-9]{2,}")
+STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "all", "any", "can", "was", "our", "out",
+    "has", "have", "had", "its", "this", "that", "with", "from", "they", "what", "when", "who",
+    "will", "would", "there", "their", "about", "which", "into", "than", "then", "them", "is",
+    "it", "of", "to", "in", "on", "at", "be", "as", "or", "an", "by", "we", "me", "my", "do"
+}
+
+
+def _words(text: str) -> List[str]:
+    return [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+
+
+def _split(msg: Message) -> Tuple[str, List[str]]:
+    """Split a source into an attribution header (kept verbatim) and sentences."""
+    content = msg.content
+    header = ""
+    if content.startswith("[Source:"):
+        header, _, content = content.partition("\n")
+    sentences = [sentence.strip() for sentence in SENTENCE_PATTERN.split(content) if sentence.strip()]
+    return header, sentences
+
+
+def _bucket(word: str) -> int:
+    # crc32 rather than hash(), which is salted per process
+    return zlib.crc32(word.encode("utf-8")) % HASH_BUCKETS
+
+
+def _lexical_scores(sentences: List[str], query: str) -> np.ndarray:
+    """TF-IDF cosine between each sentence and the query over hashed word buckets."""
+    rows, cols = [], []
+    for row, sentence in enumerate(sentences):
+        for word in _words(sentence):
+            rows.append(row)
+            cols.append(_bucket(word))
+    query_cols = [_bucket(word) for word in _words(query)]
+    if not rows or not query_cols:
+        return np.zeros(len(sentences))
+
+    counts = np.zeros((len(sentences), HASH_BUCKETS), dtype=np.float32)
+    np.add.at(counts, (np.array(rows), np.array(cols)), 1.0)
+    document_frequency = (counts > 0).sum(axis=0)
+    idf = np.log((len(sentences) + 1) / (document_frequency + 1)) + 1.0
+
+    weighted = np.log1p(counts) * idf
+    query_vector = np.zeros(HASH_BUCKETS, dtype=np.float32)
+    query_vector[query_cols] = 1.0
+    query_vector *= idf
+
+    norms = np.linalg.norm(weighted, axis=1) * np.linalg.norm(query_vector)
+    return np.divide(weighted @ query_vector, norms, out=np.zeros(len(sentences)), where=norms > 0)
+
+
+def compress_sources(sources: List[Message], query: str, budget_tokens: int) -> List[Message]:
+    """Keep only the sentences most relevant to the query, within budget_tokens.
+
+    Scoring is local and needs no API call: each sentence's lexical TF-IDF
+    cosine with the query is blended with its source's similarity to the
+    query embedding (computed during retrieval). The best sentences are kept
+    in their original order, each source keeps its attribution, and sources
+    left with no sentences are dropped.
+    """
+    headers, sentences, owners = [], [], []
+    for index, msg in enumerate(sources):
+        header, parts = _split(msg)
+        headers.append(header)
+        sentences.extend(parts)
+        owners.extend([index] * len(parts))
+    if not sentences:
+        return sources
+
+    sentence_tokens = np.array(count_tokens_batch(sentences))
+    if sentence_tokens.sum() <= budget_tokens:
+        return sources
+
+    similarities = np.array([sources[owner].similarity for owner in owners], dtype=np.float32)
+    spread = similarities.max() - similarities.min()
+    dense = (similarities - similarities.min()) / spread if spread > 0 else np.ones_like(similarities)
+    scores = DENSE_WEIGHT * dense + (1 - DENSE_WEIGHT) * _lexical_scores(sentences, query)
+
+    # Highest scores first; stop adding once the budget is spent
+    order = np.argsort(-scores, kind="stable")
+    fits = np.cumsum(sentence_tokens[order]) <= budget_tokens
+    keep = np.zeros(len(sentences), dtype=bool)
+    keep[order[fits]] = True
+
+    kept_by_source: List[List[str]] = [[] for _ in sources]
+    for sentence, owner, kept in zip(sentences, owners, keep):
+        if kept:
+            kept_by_source[owner].append(sentence)
+
+    compressed = []
+    for msg, header, kept in zip(sources, headers, kept_by_source):
+        if not kept:
+            continue
+        content = " ".join(kept)
+        compressed.append(msg.model_copy(update={"content": f"{header}\n{content}" if header else content}))
+    return compressed
+
+
+def compress_text(text: str, query: str, budget_tokens: int) -> str:
+    """Extractively compress a single block of context against the query."""
+    source = Message(message_id="context", channel_name="", sender_name="", content=text, similarity=1.0)
+    compressed = compress_sources([source], query, budget_tokens)
+    return compressed[0].content if compressed else ""
@@ -0,0 +1,131 @@
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from constants import CONTENT_NAMESPACE
+
+# Pinecone caps fetch/upsert payloads, so requests are sent in batches
+FETCH_BATCH_SIZE = 100
+UPSERT_BATCH_SIZE = 100
+
+
+def sha256_bytes(data: bytes) -> str:
+    """Hash raw file content."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_text(text: str) -> str:
+    """Hash normalized chunk text."""
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+
+def clean_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop values Pinecone refuses to store (None, nested objects)."""
+    cleaned = {}
+    for key, value in metadata.items():
+        if value is None:
+            continue
+        if isinstance(value, (str, int, float, bool)):
+            cleaned[key] = value
+        elif isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value):
+            cleaned[key] = list(value)
+        else:
+            cleaned[key] = str(value)
+    return cleaned
+
+
+def _batched(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class ContentStore:
+    """Content-addressed store of embeddings and document summaries.
+
+    Entries live in their own namespace of the chat index:
+    - `chunk:{sha256}` holds the embedding of a chunk's text
+    - `file:{sha256}` holds the summary (and its embedding) of a whole file,
+      plus the file_id whose chunks can be re-linked for identical uploads
+    """
+
+    def __init__(self, index, namespace: str = CONTENT_NAMESPACE):
+        self.index = index
+        self.namespace = namespace
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None) -> Dict[str, Any]:
+        """Fetch vectors by ID from the given namespace (defaults to the content namespace)."""
+        vectors = {}
+        for batch in _batched(list(ids), FETCH_BATCH_SIZE):
+            response = self.index.fetch(ids=batch, namespace=namespace or self.namespace)
+            vectors.update(response.vectors or {})
+        return vectors
+
+    def upsert(self, vectors: List[Tuple[str, List[float], Dict[str, Any]]], namespace: Optional[str] = None):
+        """Upsert (id, values, metadata) tuples in batches."""
+        for batch in _batched(vectors, UPSERT_BATCH_SIZE):
+            self.index.upsert(vectors=batch, namespace=namespace or self.namespace)
+
+    def delete(self, ids: List[str], namespace: Optional[str] = None):
+        """Delete vectors by ID in batches."""
+        for batch in _batched(list(ids), UPSERT_BATCH_SIZE):
+            self.index.delete(ids=batch, namespace=namespace or self.namespace)
+
+    def update_metadata(self, vector_id: str, metadata: Dict[str, Any], namespace: Optional[str] = None):
+        """Overwrite selected metadata fields of a stored vector."""
+        try:
+            self.index.update(id=vector_id, set_metadata=clean_metadata(metadata), namespace=namespace or self.namespace)
+        except Exception as e:
+            logging.error(f"Error updating metadata for {vector_id}: {str(e)}")
+
+    def get_chunk_embeddings(self, chunk_hashes: List[str]) -> Dict[str, List[float]]:
+        """Return cached embeddings for the given chunk hashes."""
+        if not chunk_hashes:
+            return {}
+        try:
+            found = self.fetch([f"chunk:{h}" for h in set(chunk_hashes)])
+        except Exception as e:
+            logging.error(f"Error fetching cached chunk embeddings: {str(e)}")
+            return {}
+        return {vector_id.split(":", 1)[1]: list(vector.values) for vector_id, vector in found.items()}
+
+    def put_chunk_embeddings(self, embeddings_by_hash: Dict[str, List[float]]):
+        """Cache chunk embeddings under their content hash."""
+        if not embeddings_by_hash:
+            return
+        try:
+            self.upsert([
+                (f"chunk:{h}", values, {"kind": "chunk"})
+                for h, values in embeddings_by_hash.items()
+            ])
+        except Exception as e:
+            logging.error(f"Error caching chunk embeddings: {str(e)}")
+
+    def get_file(self, file_hash: str) -> Optional[Tuple[List[float], Dict[str, Any]]]:
+        """Return (summary embedding, metadata) for a previously ingested file."""
+        try:
+            found = self.fetch([f"file:{file_hash}"])
+        except Exception as e:
+            logging.error(f"Error fetching file entry: {str(e)}")
+            return None
+        vector = found.get(f"file:{file_hash}")
+        if not vector:
+            return None
+        return list(vector.values), dict(vector.metadata or {})
+
+    def put_file(self, file_hash: str, summary_embedding: List[float], metadata: Dict[str, Any]):
+        """Record a file's summary and source file_id under its content hash."""
+        try:
+            self.upsert([(f"file:{file_hash}", summary_embedding, clean_metadata({**metadata, "kind": "file"}))])
+        except Exception as e:
+            logging.error(f"Error storing file entry: {str(e)}")
+
+    def ids_where(self, filter_dict: Dict[str, Any], vector: List[float], namespace: str, top_k: int = 10000) -> List[str]:
+        """IDs of vectors matching a metadata filter; any vector of the right dimension will do as the query."""
+        response = self.index.query(vector=vector, top_k=top_k, filter=filter_dict, namespace=namespace)
+        return [match.id for match in response.matches]
+
+    def list_ids(self, prefix: str, namespace: str) -> List[str]:
+        """List vector IDs sharing a prefix (serverless indexes only)."""
+        ids = []
+        for page in self.index.list(prefix=prefix, namespace=namespace):
+            ids.extend(page)
+        return ids
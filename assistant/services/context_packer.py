@@ -0,0 +1,106 @@
+import re
+from typing import Callable, List, Optional, Set
+from pydantic import BaseModel
+from models import Message
+from services.tokenizer import count_tokens, count_tokens_batch, truncate_to_tokens
+
+NEAR_DUPLICATE_THRESHOLD = 0.9  # Word-set Jaccard similarity above which two sources are duplicates
+MIN_SCORE = 1e-6
+
+
+class PackedContext(BaseModel):
+    text: str
+    sources: List[Message]  # Sources that made it into the prompt, in rank order
+    tokens: int
+    dropped: int
+
+
+def default_format(msg: Message) -> str:
+    return f"{msg.sender_name}: {msg.content}"
+
+
+def _word_set(text: str) -> Set[str]:
+    return set(re.sub(r"\W+", " ", text.lower()).split())
+
+
+def dedupe_sources(sources: List[Message]) -> List[Message]:
+    """Drop sources whose wording nearly repeats an earlier (higher-ranked) source."""
+    kept: List[Message] = []
+    kept_words: List[Set[str]] = []
+    for msg in sources:
+        words = _word_set(msg.content)
+        is_duplicate = False
+        for other in kept_words:
+            union = len(words | other)
+            if union == 0 or len(words & other) / union >= NEAR_DUPLICATE_THRESHOLD:
+                is_duplicate = True
+                break
+        if not is_duplicate:
+            kept.append(msg)
+            kept_words.append(words)
+    return kept
+
+
+def _truncate_sentence(text: str, max_tokens: int) -> str:
+    """Truncate to max_tokens, preferring to end on a complete sentence."""
+    truncated = truncate_to_tokens(text, max_tokens)
+    if truncated == text:
+        return text
+    last_period = truncated.rfind('.')
+    return truncated[:last_period + 1] if last_period > 0 else truncated
+
+
+def pack_context(
+    sources: List[Message],
+    budget_tokens: int,
+    header: str = "",
+    intro: str = "",
+    footer: str = "",
+    format_source: Callable[[Message], str] = default_format,
+    max_source_tokens: Optional[int] = None
+) -> PackedContext:
+    """Pack sources, given in rank order, into a prompt that fits budget_tokens.
+
+    Near-duplicates are removed, oversized sources are cut at a sentence
+    boundary, and the remaining budget is filled greedily by score per token.
+    Selected sources are emitted in rank order with a single join.
+    """
+    frame_tokens = count_tokens(header) + count_tokens(intro) + count_tokens(footer)
+    remaining = budget_tokens - frame_tokens
+
+    candidates = dedupe_sources(sources)
+    if max_source_tokens:
+        candidates = [
+            msg.model_copy(update={"content": _truncate_sentence(msg.content, max_source_tokens)})
+            for msg in candidates
+        ]
+    lines = [format_source(msg) for msg in candidates]
+    line_tokens = [tokens + 1 for tokens in count_tokens_batch(lines)]  # +1 for the newline
+
+    # Best value per token first; ties keep rank order
+    order = sorted(
+        range(len(candidates)),
+        key=lambda i: max(candidates[i].similarity, MIN_SCORE) / max(line_tokens[i], 1),
+        reverse=True
+    )
+    selected = []
+    used = 0
+    for i in order:
+        if used + line_tokens[i] > remaining:
+            continue
+        selected.append(i)
+        used += line_tokens[i]
+    selected.sort()
+
+    body = [lines[i] for i in selected]
+    parts = [header]
+    if body:
+        parts.append(intro)
+        parts.append("\n".join(body) + "\n")
+    parts.append(footer)
+    return PackedContext(
+        text="".join(parts),
+        sources=[candidates[i] for i in selected],
+        tokens=frame_tokens + used,
+        dropped=len(sources) - len(selected)
+    )
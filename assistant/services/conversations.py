@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+import numpy as np
+from pydantic import BaseModel
+from constants import (
+    THREAD_MEMORY_TURNS,
+    THREAD_MEMORY_MAX_TURNS,
+    THREAD_MEMORY_TTL,
+    THREAD_MEMORY_SIZE,
+    THREAD_CONTEXT_REUSE_THRESHOLD
+)
+from models import Message
+from services.deadline import current_deadline
+from services.llm import CoalescingOpenAI
+from services.tokenizer import count_tokens
+
+
+class ThreadMemory(BaseModel):
+    thread_id: str
+    scope: str  # Answer scope of the thread; memory is never shared across scopes
+    turns: List[Dict[str, str]] = []  # Recent chat turns, oldest first
+    summary: str = ""  # Rolling summary of turns that fell out of the window
+    context: List[Message] = []  # Sources retrieved for the thread
+    context_embedding: Optional[List[float]] = None  # Question the context was retrieved for
+    updated_at: float = 0
+
+    def history_tokens(self) -> int:
+        return count_tokens(self.summary) + sum(count_tokens(turn["content"]) for turn in self.turns)
+
+    def reusable_context(self, embedding: Optional[List[float]]) -> Optional[List[Message]]:
+        """The thread's retrieved context, if a follow-up with this embedding is close enough to reuse it."""
+        if not self.context or not self.context_embedding or not embedding:
+            return None
+        current = np.asarray(embedding, dtype=np.float32)
+        previous = np.asarray(self.context_embedding, dtype=np.float32)
+        similarity = float(current @ previous / ((np.linalg.norm(current) * np.linalg.norm(previous)) or 1.0))
+        return self.context if similarity >= THREAD_CONTEXT_REUSE_THRESHOLD else None
+
+
+class ConversationStore:
+    """In-process memory of assistant threads.
+
+    Each thread keeps its last THREAD_MEMORY_TURNS exchanges verbatim. Older
+    turns are folded into a rolling summary by a background completion. The
+    retrieved context is kept too, so follow-ups on the same topic can skip
+    retrieval.
+    """
+
+    def __init__(self, client: CoalescingOpenAI, max_threads: int = THREAD_MEMORY_SIZE, ttl: float = THREAD_MEMORY_TTL):
+        self.client = client
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self.threads: "OrderedDict[str, ThreadMemory]" = OrderedDict()
+        self.folding: set = set()
+        self.tasks: Set[asyncio.Task] = set()  # Background folds, kept alive until they finish
+
+    def get(self, thread_id: str, scope: str) -> Optional[ThreadMemory]:
+        memory = self.threads.get(thread_id)
+        if not memory or memory.scope != scope:
+            return None
+        if time.time() - memory.updated_at > self.ttl:
+            del self.threads[thread_id]
+            return None
+        self.threads.move_to_end(thread_id)
+        return memory
+
+    def _get_or_create(self, thread_id: str, scope: str) -> ThreadMemory:
+        memory = self.get(thread_id, scope)
+        if memory is None:
+            memory = ThreadMemory(thread_id=thread_id, scope=scope)
+            self.threads[thread_id] = memory
+            while len(self.threads) > self.max_threads:
+                self.threads.popitem(last=False)
+        memory.updated_at = time.time()
+        return memory
+
+    def set_context(self, thread_id: str, scope: str, context: List[Message], embedding: Optional[List[float]]):
+        memory = self._get_or_create(thread_id, scope)
+        memory.context = context
+        memory.context_embedding = embedding
+
+    def add_turn(self, thread_id: str, scope: str, question: str, answer: str):
+        """Record one exchange and fold older turns into the summary once the window overflows."""
+        memory = self._get_or_create(thread_id, scope)
+        memory.turns.append({"role": "user", "content": question})
+        memory.turns.append({"role": "assistant", "content": answer})
+        # Never let unfolded turns crowd the retrieved sources out of the context budget
+        memory.turns = memory.turns[-2 * THREAD_MEMORY_MAX_TURNS:]
+        if len(memory.turns) > 2 * THREAD_MEMORY_TURNS and thread_id not in self.folding:
+            self.folding.add(thread_id)
+            task = asyncio.create_task(self.fold(memory))
+            self.tasks.add(task)
+            task.add_done_callback(lambda done: self._fold_done(done, thread_id))
+
+    def _fold_done(self, task: asyncio.Task, thread_id: str):
+        """Release a finished fold, even one cancelled before it started, and log its failure."""
+        self.tasks.discard(task)
+        self.folding.discard(thread_id)
+        if not task.cancelled() and task.exception():
+            logging.error(f"Error folding thread memory: {str(task.exception())}")
+
+    async def fold(self, memory: ThreadMemory):
+        """Merge turns beyond the recent window into the thread's rolling summary."""
+        current_deadline.set(None)  # Background work is not bound by the request that scheduled it
+        try:
+            overflow = memory.turns[:-2 * THREAD_MEMORY_TURNS]
+            if not overflow:
+                return
+            transcript = "\n".join(
+                f"{'Assistant' if turn['role'] == 'assistant' else 'User'}: {turn['content']}" for turn in overflow
+            )
+            completion = await self.client.complete(
+                "thread_summary",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You keep a short running summary of an assistant conversation thread. Update the summary with the new turns. Keep facts, decisions and open questions; drop pleasantries."
+                    },
+                    {"role": "user", "content": f"Current summary:\n{memory.summary or 'None yet'}\n\nNew turns:\n{transcript}"}
+                ],
+                temperature=0.3,
+                max_tokens=400
+            )
+            memory.summary = completion.choices[0].message.content
+            # Turns added while folding stay in the window
+            memory.turns = memory.turns[len(overflow):]
+        except Exception as e:
+            logging.error(f"Error folding thread memory: {str(e)}")
+            # Keep the window rather than retry the same overflow on every turn
+            memory.turns = memory.turns[-2 * THREAD_MEMORY_TURNS:]
@@ -0,0 +1,63 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, List, Optional, TypeVar
+from constants import DEADLINE_COMPLETION_RESERVE
+
+T = TypeVar("T")
+
+
+class Deadline:
+    """Overall time budget for one request, plus the stages that had to be cut to meet it."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+        self.degraded: List[str] = []
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def degrade(self, stage: str):
+        if stage not in self.degraded:
+            logging.warning(f"Deadline: degraded {stage} with {self.remaining():.2f}s left")
+            self.degraded.append(stage)
+
+    @contextmanager
+    def activate(self):
+        """Make this the deadline seen by every stage awaited inside the block."""
+        token = current_deadline.set(self)
+        try:
+            yield self
+        finally:
+            current_deadline.reset(token)
+
+
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+async def run_stage(
+    stage: str,
+    call: Callable[[], Awaitable[T]],
+    fallback: T,
+    reserve: float = DEADLINE_COMPLETION_RESERVE
+) -> T:
+    """Run an optional stage within the current deadline, keeping `reserve` seconds for later stages.
+
+    A stage that cannot start in time is skipped and one that overruns is cut
+    short; either way the fallback is returned and the stage is reported as
+    degraded. Without a deadline the stage simply runs.
+    """
+    deadline = current_deadline.get()
+    if deadline is None:
+        return await call()
+    budget = deadline.remaining() - reserve
+    if budget <= 0:
+        deadline.degrade(stage)
+        return fallback
+    try:
+        return await asyncio.wait_for(call(), budget)
+    except asyncio.TimeoutError:
+        deadline.degrade(stage)
+        return fallback
@@ -0,0 +1,185 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from constants import (
+    LLM_PRIORITIES,
+    LLM_MAX_CONCURRENCY,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_MAX_RETRIES
+)
+
+RATE_WINDOW = 60.0  # Seconds covered by the request and token budgets
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the API asked us to wait, from the retry-after headers of a failed call."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class PriorityGovernor:
+    """Process-wide scheduler for OpenAI calls.
+
+    Calls are admitted in priority order (LLM_PRIORITIES, lower first) while
+    concurrency, requests per minute and tokens per minute stay within
+    budget. A 429 halves the concurrency limit and pauses admissions for
+    the retry-after period; the limit grows back by one each time a full
+    limit's worth of calls succeeds.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+        max_retries: int = LLM_MAX_RETRIES
+    ):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.active = 0
+        self.waiters: List[Tuple[int, int, int, asyncio.Future]] = []
+        self.sequence = itertools.count()
+        self.admitted: Deque[Tuple[float, int]] = deque()  # (time, tokens) admitted within the window
+        self.window_tokens = 0
+        self.paused_until = 0.0
+        self.successes = 0
+        self.rate_limited = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.waits: Dict[str, Deque[float]] = {name: deque(maxlen=200) for name in LLM_PRIORITIES}
+
+    def _trim_window(self, now: float):
+        while self.admitted and now - self.admitted[0][0] >= RATE_WINDOW:
+            _, tokens = self.admitted.popleft()
+            self.window_tokens -= tokens
+
+    def _admission_delay(self, tokens: int, now: float) -> Optional[float]:
+        """0 if a call can start now, seconds to wait for budget, or None when waiting on a release."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.active >= self.limit:
+            return None
+        self._trim_window(now)
+        over_requests = len(self.admitted) >= self.requests_per_minute
+        # A call bigger than the whole token budget still runs once the window is empty
+        over_tokens = self.admitted and self.window_tokens + tokens > self.tokens_per_minute
+        if over_requests or over_tokens:
+            return self.admitted[0][0] + RATE_WINDOW - now
+        return 0
+
+    def _admit(self, tokens: int, now: float):
+        self.active += 1
+        self.admitted.append((now, tokens))
+        self.window_tokens += tokens
+
+    def _dispatch(self):
+        """Admit queued calls, highest priority first, while budgets allow."""
+        self.timer = None
+        while self.waiters:
+            _, _, tokens, future = self.waiters[0]
+            if future.done():  # Cancelled while queued
+                heapq.heappop(self.waiters)
+                continue
+            now = time.monotonic()
+            delay = self._admission_delay(tokens, now)
+            if delay is None:
+                return
+            if delay > 0:
+                self.timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self.waiters)
+            self._admit(tokens, now)
+            future.set_result(None)
+
+    async def acquire(self, priority: str, tokens: int):
+        started = time.monotonic()
+        if not self.waiters and self._admission_delay(tokens, started) == 0:
+            self._admit(tokens, started)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.waiters, (LLM_PRIORITIES[priority], next(self.sequence), tokens, future))
+            if self.timer is None:
+                self._dispatch()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.release()  # Admitted just as the caller went away
+                raise
+        self.waits[priority].append(time.monotonic() - started)
+
+    def release(self):
+        self.active -= 1
+        if self.timer is None:
+            self._dispatch()
+
+    def _on_success(self):
+        self.successes += 1
+        if self.limit < self.max_concurrency and self.successes >= self.limit:
+            self.limit += 1
+            self.successes = 0
+
+    def _on_rate_limit(self, error: Exception, attempt: int):
+        self.rate_limited += 1
+        self.successes = 0
+        self.limit = max(1, self.limit // 2)
+        delay = retry_after(error) or min(2 ** attempt, 30)
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        logging.warning(f"OpenAI rate limited; concurrency limit now {self.limit}, pausing {delay:.1f}s")
+
+    async def run(self, priority: str, tokens: int, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Run call once admitted, retrying rate limits and transient errors."""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(priority, tokens)
+            try:
+                result = await call()
+            except RETRYABLE_ERRORS as e:
+                rate_limited = isinstance(e, RateLimitError)
+                if rate_limited:
+                    self._on_rate_limit(e, attempt)  # Pause before the slot frees up
+                self.release()
+                if attempt == self.max_retries:
+                    raise
+                if not rate_limited:
+                    await asyncio.sleep(min(2 ** attempt, 30))
+                continue
+            except BaseException:
+                self.release()
+                raise
+            self.release()
+            self._on_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        queue_waits = {}
+        for name, waits in self.waits.items():
+            ordered = sorted(waits)
+            queue_waits[name] = {
+                "calls": len(ordered),
+                "p50_seconds": round(ordered[len(ordered) // 2], 3) if ordered else None,
+                "p95_seconds": round(ordered[int(len(ordered) * 0.95)], 3) if ordered else None
+            }
+        return {
+            "concurrency_limit": self.limit,
+            "active": self.active,
+            "queued": sum(1 for *_, future in self.waiters if not future.done()),
+            "rate_limited": self.rate_limited,
+            "queue_wait": queue_waits
+        }
@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from constants import HOT_TIER_WINDOW, HOT_TIER_SIZE
+
+
+def matches_filter(metadata: Dict[str, Any], filter_dict: Optional[Dict]) -> bool:
+    """Evaluate the subset of Pinecone's metadata filter language that FilterBuilder produces."""
+    for key, condition in (filter_dict or {}).items():
+        if key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+                if operator in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if operator == "$gt" and not value > operand:
+                        return False
+                    if operator == "$gte" and not value >= operand:
+                        return False
+                    if operator == "$lt" and not value < operand:
+                        return False
+                    if operator == "$lte" and not value <= operand:
+                        return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class HotMessageIndex:
+    """In-process vector index of the messages posted in the last HOT_TIER_WINDOW seconds.
+
+    Fed by /vector/update with the embedding computed for Pinecone, so a new
+    message is searchable here before Pinecone has indexed it. Scores are
+    cosine similarities, like Pinecone's, so hot and cold results rank
+    together. Vectors live in slots of one preallocated matrix; messages
+    older than the window, or beyond HOT_TIER_SIZE, free their slot oldest
+    first; a deleted message frees its slot straight away. The matrix grows
+    lazily up to HOT_TIER_SIZE rows. Searches may run in a worker thread, so
+    every access holds the index lock.
+    """
+
+    def __init__(self, window: float = HOT_TIER_WINDOW, max_entries: int = HOT_TIER_SIZE):
+        self.window = window
+        self.max_entries = max_entries
+        self.vectors: Optional[np.ndarray] = None  # Unit-normalized rows, one per slot
+        self.documents: List[Optional[Document]] = []  # Document per slot, None when free
+        self.order: Deque[Tuple[float, int]] = deque()  # (timestamp, slot), oldest first
+        self.free: List[int] = []
+        self.message_slots: Dict[str, int] = {}  # message_id -> slot, for deletes
+        self.lock = threading.Lock()
+        self.searches = 0
+        self.hits = 0
+
+    def _free(self, slot: int):
+        document = self.documents[slot]
+        if document is not None:
+            self.message_slots.pop(document.metadata.get("message_id"), None)
+        self.documents[slot] = None
+        self.free.append(slot)
+
+    def _release(self):
+        _, slot = self.order.popleft()
+        self._free(slot)
+
+    def _slot(self, dimension: int) -> int:
+        if self.free:
+            return self.free.pop()
+        rows = len(self.documents)
+        grown = min(max(rows * 2, 64), self.max_entries)
+        vectors = np.zeros((grown, dimension), dtype=np.float32)
+        if self.vectors is not None:
+            vectors[:rows] = self.vectors
+        self.vectors = vectors
+        self.documents.extend([None] * (grown - rows))
+        self.free.extend(range(grown - 1, rows, -1))
+        return rows
+
+    def add(self, document: Document, embedding: List[float]):
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self.lock:
+            self._evict()
+            if len(self.order) >= self.max_entries:
+                self._release()
+            slot = self._slot(len(vector))
+            self.vectors[slot] = vector / (np.linalg.norm(vector) or 1.0)
+            self.documents[slot] = document
+            if document.metadata.get("message_id"):
+                self.message_slots[document.metadata["message_id"]] = slot
+            self.order.append((float(document.metadata.get("timestamp", time.time())), slot))
+
+    def remove(self, message_id: str) -> Optional[Document]:
+        """Forget a deleted message; returns its document if it was hot."""
+        with self.lock:
+            slot = self.message_slots.get(message_id)
+            if slot is None:
+                return None
+            document = self.documents[slot]
+            self.order = deque(entry for entry in self.order if entry[1] != slot)
+            self._free(slot)
+            return document
+
+    def _evict(self):
+        """Free the slots of messages older than the window."""
+        cutoff = time.time() - self.window
+        while self.order and self.order[0][0] < cutoff:
+            self._release()
+
+    def search(self, embedding: List[float], k: int, filter_dict: Optional[Dict] = None) -> List[tuple]:
+        """(doc, score) pairs for the k nearest hot messages that pass the filter, best first.
+
+        Blocking; callers on the event loop run it in a thread.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self.lock:
+            self._evict()
+            self.searches += 1
+            if not self.order:
+                return []
+            scores = self.vectors @ query
+            results = []
+            for slot in np.argsort(-scores):
+                document = self.documents[slot]
+                if document is not None and matches_filter(document.metadata, filter_dict):
+                    results.append((document, float(scores[slot])))
+                    if len(results) >= k:
+                        break
+            if results:
+                self.hits += 1
+            return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "messages": len(self.order),
+                "oldest": self.order[0][0] if self.order else None,
+                "slots": len(self.documents),
+                "searches": self.searches,
+                "hits": self.hits
+            }
+
+
+# Fed by /vector/update and searched before Pinecone
+hot_index = HotMessageIndex()
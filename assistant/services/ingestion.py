@@ -0,0 +1,396 @@
+import asyncio
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_community.document_loaders.pdf import PyPDFLoader
+from langchain.prompts.prompt import PromptTemplate
+from constants import SUMMARY_NAMESPACE, DOCUMENT_NAMESPACE, REINGEST_SUMMARY_THRESHOLD
+from models import ProcessDocumentResponse
+from services.content_store import ContentStore, sha256_bytes, sha256_text, clean_metadata
+from services.tokenizer import token_text_splitter
+from services.llm import CoalescingOpenAI
+
+EMBED_BATCH_SIZE = 256  # Chunks embedded per request while streaming into the index
+
+# Chunk metadata that must be rewritten when a kept chunk moves
+REINGEST_TRACKED_FIELDS = ("chunk_index", "total_chunks", "page_number", "file_name", "channel_id")
+
+# Initialize prompt template for summaries
+SUMMARY_TEMPLATE = """Provide a comprehensive summary of this document that captures the main topics and key information.
+This summary will be used to help find this document when relevant to user queries.
+
+Document: {document}
+
+Summary:"""
+
+summary_prompt = PromptTemplate(
+    template=SUMMARY_TEMPLATE,
+    input_variables=["document"]
+)
+
+
+def load_documents(content: bytes, file_name: str, file_type: Optional[str] = None) -> List[Document]:
+    """Extract page documents from raw file content."""
+    is_pdf = (file_type or "").endswith("pdf") or file_name.lower().endswith(".pdf")
+    if not is_pdf:
+        return [Document(page_content=content.decode("utf-8", errors="replace"), metadata={"source": file_name})]
+
+    # Create temporary file
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+        temp_file.write(content)
+        temp_path = temp_file.name
+    try:
+        return PyPDFLoader(temp_path).load()
+    finally:
+        # Clean up temporary file
+        try:
+            os.unlink(temp_path)
+        except Exception as cleanup_error:
+            print(f"Warning: Failed to clean up temporary file: {str(cleanup_error)}")
+
+
+class IngestionManager:
+    """Single ingestion path for every document endpoint.
+
+    Chunks are hashed and deduplicated through the content store, embedded in
+    batches that stream into the index while the summary is generated
+    concurrently, and keyed by file_id so retrieval can expand them.
+    """
+
+    def __init__(self, embeddings, client: CoalescingOpenAI, content_store: ContentStore):
+        self.embeddings = embeddings
+        self.client = client
+        self.content_store = content_store
+
+    async def ingest(
+        self,
+        content: bytes,
+        file_id: str,
+        file_name: str,
+        file_type: Optional[str] = None,
+        channel_id: Optional[str] = None,
+        uploader_id: Optional[str] = None,
+        reingest: bool = False
+    ) -> ProcessDocumentResponse:
+        """Ingest a file: re-link identical content, diff edits, or process from scratch."""
+        file_hash = sha256_bytes(content)
+
+        # Identical content was ingested before: reuse its chunks, embeddings and summary
+        if not reingest:
+            file_entry = await asyncio.to_thread(self.content_store.get_file, file_hash)
+            if file_entry:
+                total_chunks = await self.relink_file(file_entry, file_id, file_name, channel_id, uploader_id)
+                if total_chunks is not None:
+                    return ProcessDocumentResponse(
+                        message="Document processed successfully",
+                        file_name=file_name,
+                        chunks_created=total_chunks,
+                        chunks_embedded=0
+                    )
+
+        raw_documents = await asyncio.to_thread(load_documents, content, file_name, file_type)
+        chunks = self.split_chunks(raw_documents, file_id, file_name, channel_id, uploader_id)
+
+        if reingest:
+            return await self.reingest(raw_documents, chunks, file_id, file_name, file_hash, channel_id)
+
+        # Chunks stream into the index while the summary is generated
+        embedded, (summary_embedding, summary_metadata) = await asyncio.gather(
+            self.store_chunks(chunks, file_id),
+            self.summarize(raw_documents, file_id, file_name, len(chunks), channel_id)
+        )
+        # Only a fully stored file may be re-linked by later identical uploads
+        await asyncio.to_thread(self.content_store.put_file, file_hash, summary_embedding, summary_metadata)
+        return ProcessDocumentResponse(
+            message="Document processed successfully",
+            file_name=file_name,
+            chunks_created=len(chunks),
+            chunks_embedded=embedded
+        )
+
+    def split_chunks(
+        self,
+        raw_documents: List[Document],
+        file_id: str,
+        file_name: str,
+        channel_id: Optional[str] = None,
+        uploader_id: Optional[str] = None
+    ) -> List[Document]:
+        """Split documents into hashed chunks with file metadata."""
+        # Split documents into chunks sized in tokens
+        chunks = token_text_splitter().split_documents(raw_documents)
+        print(f"Split into {len(chunks)} chunks")
+
+        # Repeated chunks (headers, footers) share a hash and are stored once per file
+        unique_chunks = []
+        seen_hashes = set()
+        for chunk in chunks:
+            chunk_hash = sha256_text(chunk.page_content)
+            if chunk_hash in seen_hashes:
+                continue
+            seen_hashes.add(chunk_hash)
+            chunk.metadata["content_hash"] = chunk_hash
+            unique_chunks.append(chunk)
+
+        # Add metadata to chunks
+        for i, chunk in enumerate(unique_chunks):
+            chunk.metadata.update({
+                "file_id": file_id,
+                "file_name": file_name,
+                "channel_id": channel_id,
+                "user_id": uploader_id,
+                "chunk_index": i,
+                "total_chunks": len(unique_chunks),
+                "source_type": "document",
+                "page_number": chunk.metadata.get("page", 1)
+            })
+        return unique_chunks
+
+    async def embed_chunks(self, chunks: List[Document]) -> Tuple[Dict[str, List[float]], int]:
+        """Return embeddings by content hash, embedding only hashes not seen before."""
+        hashes = [chunk.metadata["content_hash"] for chunk in chunks]
+        vectors_by_hash = await asyncio.to_thread(self.content_store.get_chunk_embeddings, hashes)
+
+        missing = [chunk for chunk in chunks if chunk.metadata["content_hash"] not in vectors_by_hash]
+        if missing:
+            new_vectors = await self.embeddings.aembed_documents([chunk.page_content for chunk in missing])
+            fresh = {
+                chunk.metadata["content_hash"]: vector
+                for chunk, vector in zip(missing, new_vectors)
+            }
+            await asyncio.to_thread(self.content_store.put_chunk_embeddings, fresh)
+            vectors_by_hash.update(fresh)
+        return vectors_by_hash, len(missing)
+
+    @staticmethod
+    def chunk_record(chunk: Document, file_id: str, values: List[float]) -> Tuple[str, List[float], Dict[str, Any]]:
+        """Build the Pinecone record for a chunk."""
+        return (
+            f"{file_id}#{chunk.metadata['content_hash']}",
+            values,
+            clean_metadata({**chunk.metadata, "text": chunk.page_content})
+        )
+
+    async def store_chunks(self, chunks: List[Document], file_id: str) -> int:
+        """Embed and upsert chunks batch by batch; each upsert overlaps the next embedding call.
+
+        Returns the number of chunks that needed a new embedding.
+        """
+        embedded = 0
+        pending_upsert = None
+        for i in range(0, len(chunks), EMBED_BATCH_SIZE):
+            batch = chunks[i:i + EMBED_BATCH_SIZE]
+            vectors_by_hash, batch_embedded = await self.embed_chunks(batch)
+            embedded += batch_embedded
+            records = [
+                self.chunk_record(chunk, file_id, vectors_by_hash[chunk.metadata["content_hash"]])
+                for chunk in batch
+            ]
+            if pending_upsert:
+                await pending_upsert
+            pending_upsert = asyncio.create_task(
+                asyncio.to_thread(self.content_store.upsert, records, DOCUMENT_NAMESPACE)
+            )
+        if pending_upsert:
+            await pending_upsert
+        print(f"Stored {len(chunks)} chunks ({embedded} newly embedded)")
+        return embedded
+
+    def store_summary(self, summary: str, summary_embedding: List[float], metadata: Dict[str, Any]):
+        """Store a document summary keyed by its file_id."""
+        self.content_store.upsert(
+            [(metadata["file_id"], summary_embedding, clean_metadata({**metadata, "text": summary}))],
+            namespace=SUMMARY_NAMESPACE
+        )
+
+    async def summarize(
+        self,
+        raw_documents: List[Document],
+        file_id: str,
+        file_name: str,
+        total_chunks: int,
+        channel_id: Optional[str] = None
+    ) -> Tuple[List[float], Dict[str, Any]]:
+        """Generate and store document summary.
+
+        Returns the summary embedding and metadata for the file's content-store entry,
+        which the caller records once the chunks are stored.
+        """
+        try:
+            # Combine all document content
+            all_text = "\n\n".join([doc.page_content for doc in raw_documents])
+
+            # Generate summary using prompt template
+            completion = await self.client.complete(
+                "document_summary",
+                messages=[{"role": "user", "content": summary_prompt.format(document=all_text)}],
+                temperature=0
+            )
+            summary = completion.choices[0].message.content
+            summary_embedding = (await self.embeddings.aembed_documents([summary]))[0]
+
+            metadata = {
+                "file_id": file_id,
+                "file_name": file_name,
+                "channel_id": channel_id,
+                "source_type": "document_summary",
+                "total_pages": len(raw_documents),
+                "total_chunks": total_chunks
+            }
+            await asyncio.to_thread(self.store_summary, summary, summary_embedding, metadata)
+            print("Stored document summary")
+
+            # Remembered by the caller so identical uploads skip the LLM call
+            return summary_embedding, {**metadata, "summary": summary}
+
+        except Exception as e:
+            print(f"Error processing summary: {str(e)}")
+            raise
+
+    async def relink_file(
+        self,
+        file_entry: Tuple[List[float], Dict[str, Any]],
+        file_id: str,
+        file_name: str,
+        channel_id: Optional[str] = None,
+        uploader_id: Optional[str] = None
+    ) -> Optional[int]:
+        """Copy the chunks and summary of an identical, already ingested file onto a new file_id.
+
+        Returns the number of chunks linked, or None if the source chunks are gone.
+        """
+        summary_embedding, file_metadata = file_entry
+        source_file_id = file_metadata.get("file_id")
+        if not source_file_id:
+            return None
+
+        source_ids = await asyncio.to_thread(self.content_store.list_ids, f"{source_file_id}#", DOCUMENT_NAMESPACE)
+        # Partially stored or deleted source chunks cannot stand in for the file
+        if not source_ids or len(source_ids) < int(file_metadata.get("total_chunks", 0)):
+            return None
+        source_vectors = await asyncio.to_thread(self.content_store.fetch, source_ids, DOCUMENT_NAMESPACE)
+
+        linked = []
+        for vector in source_vectors.values():
+            metadata = dict(vector.metadata or {})
+            chunk_hash = metadata.get("content_hash") or sha256_text(metadata.get("text", ""))
+            metadata.update({
+                "file_id": file_id,
+                "file_name": file_name,
+                "channel_id": channel_id,
+                "user_id": uploader_id,
+                "content_hash": chunk_hash
+            })
+            linked.append((f"{file_id}#{chunk_hash}", list(vector.values), clean_metadata(metadata)))
+        await asyncio.to_thread(self.content_store.upsert, linked, DOCUMENT_NAMESPACE)
+
+        await asyncio.to_thread(
+            self.store_summary,
+            file_metadata.get("summary", ""),
+            summary_embedding,
+            {
+                "file_id": file_id,
+                "file_name": file_name,
+                "channel_id": channel_id,
+                "source_type": "document_summary",
+                "total_pages": file_metadata.get("total_pages", 1),
+                "total_chunks": len(linked)
+            }
+        )
+        print(f"Re-linked {len(linked)} chunks from file {source_file_id}")
+        return len(linked)
+
+    async def reingest_chunks(self, chunks: List[Document], file_id: str, file_name: str) -> Dict[str, int]:
+        """Diff the new chunk set against the stored one for file_id and apply only the changes.
+
+        Added chunks are embedded, removed chunks are deleted and kept chunks are
+        rewritten with their stored vectors only when their position changed.
+        """
+        try:
+            new_by_hash = {chunk.metadata["content_hash"]: chunk for chunk in chunks}
+
+            existing_ids = await asyncio.to_thread(self.content_store.list_ids, f"{file_id}#", DOCUMENT_NAMESPACE)
+            existing = await asyncio.to_thread(self.content_store.fetch, existing_ids, DOCUMENT_NAMESPACE) if existing_ids else {}
+            existing_by_hash = {vector_id.split("#", 1)[1]: vector for vector_id, vector in existing.items()}
+
+            added = [chunk for chunk_hash, chunk in new_by_hash.items() if chunk_hash not in existing_by_hash]
+            removed_ids = [f"{file_id}#{chunk_hash}" for chunk_hash in existing_by_hash if chunk_hash not in new_by_hash]
+
+            vectors_by_hash, embedded = await self.embed_chunks(added)
+            records = [
+                self.chunk_record(chunk, file_id, vectors_by_hash[chunk.metadata["content_hash"]])
+                for chunk in added
+            ]
+
+            # Kept chunks reuse their stored vectors and are rewritten only when renumbered
+            renumbered = 0
+            for chunk_hash, chunk in new_by_hash.items():
+                vector = existing_by_hash.get(chunk_hash)
+                if vector is None:
+                    continue
+                stored = vector.metadata or {}
+                if any(stored.get(key) != chunk.metadata.get(key) for key in REINGEST_TRACKED_FIELDS):
+                    records.append(self.chunk_record(chunk, file_id, list(vector.values)))
+                    renumbered += 1
+
+            # Chunks stored before IDs were keyed by file_id have random IDs; find them by metadata
+            probe = records[0][1] if records else next((list(vector.values) for vector in existing.values()), None)
+            if probe is not None:
+                matching_ids = await asyncio.to_thread(
+                    self.content_store.ids_where, {"file_id": file_id}, probe, DOCUMENT_NAMESPACE
+                )
+                removed_ids += [vector_id for vector_id in matching_ids if not vector_id.startswith(f"{file_id}#")]
+
+            await asyncio.to_thread(self.content_store.upsert, records, DOCUMENT_NAMESPACE)
+            if removed_ids:
+                await asyncio.to_thread(self.content_store.delete, removed_ids, DOCUMENT_NAMESPACE)
+
+            print(
+                f"Re-ingested {file_name}: {len(added)} added ({embedded} newly embedded), "
+                f"{len(removed_ids)} removed, {renumbered} renumbered"
+            )
+            return {
+                "total_chunks": len(chunks),
+                "added": len(added),
+                "removed": len(removed_ids),
+                "embedded": embedded,
+                "previous_chunks": len(existing_by_hash)
+            }
+
+        except Exception as e:
+            print(f"Error re-ingesting chunks: {str(e)}")
+            raise
+
+    async def reingest(
+        self,
+        raw_documents: List[Document],
+        chunks: List[Document],
+        file_id: str,
+        file_name: str,
+        file_hash: str,
+        channel_id: Optional[str] = None
+    ) -> ProcessDocumentResponse:
+        """Apply a chunk diff for an edited file, re-summarizing only after substantial changes."""
+        stats = await self.reingest_chunks(chunks, file_id, file_name)
+
+        changed = stats["added"] + stats["removed"]
+        changed_fraction = changed / max(stats["total_chunks"], stats["previous_chunks"], 1)
+        if stats["previous_chunks"] == 0 or changed_fraction >= REINGEST_SUMMARY_THRESHOLD:
+            summary_embedding, summary_metadata = await self.summarize(raw_documents, file_id, file_name, stats["total_chunks"], channel_id)
+            await asyncio.to_thread(self.content_store.put_file, file_hash, summary_embedding, summary_metadata)
+        elif changed:
+            await asyncio.to_thread(
+                self.content_store.update_metadata,
+                file_id,
+                {"total_chunks": stats["total_chunks"], "total_pages": len(raw_documents)},
+                namespace=SUMMARY_NAMESPACE
+            )
+
+        return ProcessDocumentResponse(
+            message="Document re-ingested successfully",
+            file_name=file_name,
+            chunks_created=stats["added"],
+            chunks_embedded=stats["embedded"],
+            chunks_deleted=stats["removed"]
+        )
@@ -0,0 +1,306 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from openai import AsyncOpenAI
+from constants import MODEL_TIERS, MODEL_ROUTES, MAX_TOKENS, DEADLINE_FALLBACK_RESERVE, DEADLINE_ROUTED_SHARE
+from services.deadline import current_deadline
+from services.governor import PriorityGovernor
+from services.tokenizer import count_tokens, count_tokens_batch
+
+# Load environment variables
+load_dotenv()
+
+
+def request_key(kind: str, payload: Dict[str, Any]) -> str:
+    """Stable hash of a request, so identical calls map to the same key."""
+    encoded = json.dumps({"kind": kind, **payload}, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one upstream call.
+
+    The first caller starts the call; anyone arriving while it is in flight
+    awaits the same result. The call is shielded, so a cancelled caller does
+    not cancel it for the others; once the last caller has gone away (e.g. a
+    timed-out budget), the call itself is cancelled so it stops holding
+    governor capacity.
+    """
+
+    def __init__(self):
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.waiters: Dict[asyncio.Task, int] = {}
+        self.calls = 0
+        self.deduplicated = 0
+        self.abandoned = 0
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every caller went away
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.inflight.get(key)
+        if task is not None:
+            self.deduplicated += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(call())
+            self.inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        self.waiters[task] = self.waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.waiters[task] == 1 and not task.done():
+                self.abandoned += 1
+                task.cancel()
+            raise
+        finally:
+            self.waiters[task] -= 1
+            if not self.waiters[task]:
+                del self.waiters[task]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "deduplicated": self.deduplicated,
+            "abandoned": self.abandoned,
+            "in_flight": len(self.inflight)
+        }
+
+
+def estimate_chat_tokens(request: Dict[str, Any]) -> int:
+    """Prompt plus maximum completion tokens, for the governor's token budget."""
+    prompt = sum(count_tokens(str(message.get("content") or "")) for message in request.get("messages", []))
+    return prompt + (request.get("max_tokens") or MAX_TOKENS)
+
+
+class _Completions:
+    def __init__(self, owner: "CoalescingOpenAI"):
+        self.owner = owner
+
+    async def create(self, **kwargs):
+        return await self.owner.create(kwargs)
+
+
+class _Chat:
+    def __init__(self, owner: "CoalescingOpenAI"):
+        self.completions = _Completions(owner)
+
+
+class SiteMetrics:
+    """Latency and token usage of one LLM call site."""
+
+    def __init__(self, window: int = 200):
+        self.calls = 0
+        self.fallbacks = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float, usage=None):
+        self.calls += 1
+        self.latencies.append(latency)
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        return {
+            "calls": self.calls,
+            "fallbacks": self.fallbacks,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "p50_seconds": round(ordered[len(ordered) // 2], 3) if ordered else None,
+            "p95_seconds": round(ordered[int(len(ordered) * 0.95)], 3) if ordered else None
+        }
+
+
+class CoalescingOpenAI:
+    """Shared OpenAI client: governs and coalesces requests and routes call sites to model tiers.
+
+    chat.completions.create is a drop-in for AsyncOpenAI at chat priority. complete() and
+    stream() pick the model from MODEL_ROUTES for a named call site; a
+    completion that overruns its site's latency budget is retried once on
+    the fallback tier.
+    """
+
+    def __init__(self, client: AsyncOpenAI, governor: PriorityGovernor):
+        self.client = client
+        self.governor = governor
+        self.flights = SingleFlight()
+        self.chat = _Chat(self)
+        self.sites: Dict[str, SiteMetrics] = {}
+
+    async def create(self, request: Dict[str, Any], priority: str = "chat"):
+        """Run a chat completion through the governor, sharing identical in-flight requests."""
+        def call():
+            return self.governor.run(
+                priority,
+                estimate_chat_tokens(request),
+                lambda: self.client.chat.completions.create(**request)
+            )
+
+        # Streams belong to a single consumer and cannot be shared
+        if request.get("stream"):
+            return await call()
+        return await self.flights.do(request_key("chat", request), call)
+
+    def route(self, site: str) -> Dict[str, Any]:
+        return MODEL_ROUTES.get(site, MODEL_ROUTES['chat'])
+
+    def model_for(self, site: str) -> str:
+        return MODEL_TIERS[self.route(site)['tier']]
+
+    def metrics(self, site: str) -> SiteMetrics:
+        return self.sites.setdefault(site, SiteMetrics())
+
+    async def complete(self, site: str, **kwargs):
+        """Run a chat completion for a call site on its routed model.
+
+        Under a request deadline the routed model gets DEADLINE_ROUTED_SHARE
+        of the time left instead of its route budget, so the fallback tier
+        still fits in the rest; with DEADLINE_FALLBACK_RESERVE or less left
+        the fallback tier is used straight away.
+        """
+        route = self.route(site)
+        metrics = self.metrics(site)
+        tier = route['tier']
+        fallback: Optional[str] = route.get('fallback')
+        priority = route['priority']
+        budget = route['budget']
+        deadline = current_deadline.get()
+        if deadline and fallback:
+            remaining = deadline.remaining()
+            budget = min(budget, remaining * DEADLINE_ROUTED_SHARE)
+            if remaining <= DEADLINE_FALLBACK_RESERVE:
+                deadline.degrade(site)
+                metrics.fallbacks += 1
+                tier, fallback = fallback, None
+        started = time.perf_counter()
+        try:
+            request = self.create({"model": MODEL_TIERS[tier], **kwargs}, priority)
+            if fallback:
+                try:
+                    completion = await asyncio.wait_for(request, budget)
+                except asyncio.TimeoutError:
+                    logging.warning(f"{site} exceeded its {budget:.1f}s budget; retrying on {fallback} tier")
+                    metrics.fallbacks += 1
+                    if deadline:
+                        deadline.degrade(site)
+                    completion = await self.create({"model": MODEL_TIERS[fallback], **kwargs}, priority)
+            else:
+                completion = await request
+        except Exception:
+            metrics.errors += 1
+            raise
+        metrics.record(time.perf_counter() - started, getattr(completion, "usage", None))
+        return completion
+
+    async def stream(self, site: str, **kwargs):
+        """Open a streamed chat completion for a call site; latency is time to open the stream."""
+        route = self.route(site)
+        metrics = self.metrics(site)
+        tier = route['tier']
+        deadline = current_deadline.get()
+        if deadline and route.get('fallback') and deadline.remaining() <= DEADLINE_FALLBACK_RESERVE:
+            # Too little time left to wait on the routed model
+            deadline.degrade(site)
+            metrics.fallbacks += 1
+            tier = route['fallback']
+        started = time.perf_counter()
+        try:
+            stream = await self.create({
+                "model": MODEL_TIERS[tier],
+                "stream": True,
+                "stream_options": {"include_usage": True},
+                **kwargs
+            }, route['priority'])
+        except Exception:
+            metrics.errors += 1
+            raise
+        metrics.record(time.perf_counter() - started)
+        return stream
+
+    def record_usage(self, site: str, usage):
+        """Add token usage reported at the end of a stream."""
+        metrics = self.metrics(site)
+        metrics.prompt_tokens += usage.prompt_tokens or 0
+        metrics.completion_tokens += usage.completion_tokens or 0
+
+    def stats(self) -> Dict[str, int]:
+        return self.flights.stats()
+
+    def site_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {site: metrics.stats() for site, metrics in self.sites.items()}
+
+
+class CoalescingEmbeddings(Embeddings):
+    """Embeddings wrapper that governs async embedding requests and shares identical in-flight ones.
+
+    Document batches run at ingestion priority, single queries at chat priority.
+    """
+
+    def __init__(self, embeddings: Embeddings, governor: PriorityGovernor):
+        self.embeddings = embeddings
+        self.governor = governor
+        self.model = getattr(embeddings, "model", "")
+        self.flights = SingleFlight()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.aembed_batch(texts, "ingestion")
+
+    async def aembed_batch(self, texts: List[str], priority: str) -> List[List[float]]:
+        """Embed many texts in one request at the given governor priority."""
+        return await self.flights.do(
+            request_key("documents", {"model": self.model, "input": texts}),
+            lambda: self.governor.run(
+                priority,
+                sum(count_tokens_batch(texts)),
+                lambda: self.embeddings.aembed_documents(texts)
+            )
+        )
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.flights.do(
+            request_key("query", {"model": self.model, "input": text}),
+            lambda: self.governor.run("chat", count_tokens(text), lambda: self.embeddings.aembed_query(text))
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return self.flights.stats()
+
+
+def llm_stats() -> Dict[str, Any]:
+    """Call counts for the shared clients plus per-site latency and token usage."""
+    return {
+        "chat": openai_client.stats(),
+        "embeddings": embeddings.stats(),
+        "sites": openai_client.site_stats(),
+        "governor": governor.stats()
+    }
+
+
+# Shared clients for every router; retries are left to the governor so it sees every 429
+governor = PriorityGovernor()
+openai_client = CoalescingOpenAI(AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0), governor)
+embeddings = CoalescingEmbeddings(OpenAIEmbeddings(model="text-embedding-3-large", max_retries=0), governor)
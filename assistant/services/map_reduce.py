@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import List, Optional
+from services.llm import CoalescingOpenAI
+from constants import MAP_REDUCE_CONCURRENCY, MAP_REDUCE_CACHE_SIZE
+from services.content_store import sha256_text
+from services.tokenizer import count_tokens, split_by_tokens, truncate_to_tokens
+
+SLICE_SUMMARY_TOKENS = 1000
+MAX_REDUCE_LEVELS = 4
+
+
+class MapReduceSummarizer:
+    """Shrinks oversized context with a concurrent, hierarchical map-reduce.
+
+    Every slice is summarized in parallel (bounded by a semaphore); if the
+    joined summaries still exceed the budget they are summarized again.
+    Slice summaries are cached by content hash so repeated context is free.
+    """
+
+    def __init__(
+        self,
+        client: CoalescingOpenAI,
+        site: str = "map_reduce",
+        concurrency: int = MAP_REDUCE_CONCURRENCY,
+        cache_size: int = MAP_REDUCE_CACHE_SIZE
+    ):
+        self.client = client
+        self.site = site
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.cache: "OrderedDict[str, str]" = OrderedDict()
+        self.cache_size = cache_size
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        summary = self.cache.get(key)
+        if summary is not None:
+            self.cache.move_to_end(key)
+        return summary
+
+    def _cache_put(self, key: str, summary: str):
+        self.cache[key] = summary
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def summarize_slice(self, text: str) -> Optional[str]:
+        key = sha256_text(text)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        async with self.semaphore:
+            try:
+                completion = await self.client.complete(
+                    self.site,
+                    messages=[
+                        {"role": "system", "content": "Summarize this content while preserving key details and facts:"},
+                        {"role": "user", "content": text}
+                    ],
+                    temperature=0.3,  # Lower temperature for more factual summaries
+                    max_tokens=SLICE_SUMMARY_TOKENS
+                )
+            except Exception as e:
+                logging.error(f"Error summarizing chunk: {str(e)}")
+                return None
+        summary = completion.choices[0].message.content
+        self._cache_put(key, summary)
+        return summary
+
+    async def summarize(self, text: str, budget_tokens: int) -> str:
+        """Reduce text until it fits budget_tokens."""
+        for _ in range(MAX_REDUCE_LEVELS):
+            if count_tokens(text) <= budget_tokens:
+                return text
+            slices = split_by_tokens(text, budget_tokens)
+            summaries: List[Optional[str]] = await asyncio.gather(
+                *(self.summarize_slice(piece) for piece in slices)
+            )
+            kept = [summary for summary in summaries if summary]
+            if not kept:
+                break
+            text = "\n\n".join(kept)
+        return truncate_to_tokens(text, budget_tokens)
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Set
+from services.llm import CoalescingOpenAI
+from pydantic import BaseModel
+from constants import (
+    MAX_CONTEXT_TOKENS,
+    PERSONA_NAMESPACE,
+    PERSONA_REFRESH_BATCH,
+    PERSONA_MAX_EXAMPLES
+)
+from services.tokenizer import truncate_to_tokens
+
+MAX_EXAMPLE_CHARS = 500  # Keeps digest metadata well under Pinecone's per-vector limit
+
+
+class PersonaDigest(BaseModel):
+    user_id: str
+    username: str
+    style: str
+    topics: List[str] = []
+    examples: List[str] = []  # Representative messages, verbatim
+    message_count: int = 0
+    updated_at: float = 0
+
+
+class PersonaDigestStore:
+    """Per-user persona digests persisted in their own namespace of the chat index (ID = user_id)."""
+
+    def __init__(self, index, namespace: str = PERSONA_NAMESPACE):
+        self.index = index
+        self.namespace = namespace
+
+    def get(self, user_id: str) -> Optional[PersonaDigest]:
+        try:
+            response = self.index.fetch(ids=[user_id], namespace=self.namespace)
+        except Exception as e:
+            logging.error(f"Error fetching persona digest: {str(e)}")
+            return None
+        vector = (response.vectors or {}).get(user_id)
+        if not vector:
+            return None
+        metadata = vector.metadata or {}
+        return PersonaDigest(
+            user_id=user_id,
+            username=metadata.get("username", "Unknown User"),
+            style=metadata.get("text", ""),
+            topics=list(metadata.get("topics", [])),
+            examples=list(metadata.get("examples", [])),
+            message_count=int(metadata.get("message_count", 0)),
+            updated_at=float(metadata.get("updated_at", 0))
+        )
+
+    def put(self, digest: PersonaDigest, embedding: List[float]):
+        try:
+            self.index.upsert(
+                vectors=[(
+                    digest.user_id,
+                    embedding,
+                    {
+                        "text": digest.style,
+                        "username": digest.username,
+                        "topics": digest.topics,
+                        "examples": digest.examples,
+                        "message_count": digest.message_count,
+                        "updated_at": digest.updated_at
+                    }
+                )],
+                namespace=self.namespace
+            )
+        except Exception as e:
+            logging.error(f"Error storing persona digest: {str(e)}")
+
+
+class PersonaManager:
+    """Builds persona digests and folds new messages into them incrementally.
+
+    New messages seen by /vector/update are buffered per user; once
+    PERSONA_REFRESH_BATCH have accumulated, one background completion merges
+    them into the stored digest.
+    """
+
+    def __init__(self, client: CoalescingOpenAI, embeddings, store: PersonaDigestStore):
+        self.client = client
+        self.embeddings = embeddings
+        self.store = store
+        self.pending: Dict[str, List[str]] = {}
+        self.usernames: Dict[str, str] = {}
+        self.refreshing: Set[str] = set()
+        self.tasks: Set[asyncio.Task] = set()  # Background refreshes, kept alive until they finish
+
+    def observe(self, user_id: str, username: str, content: str):
+        """Buffer a new message and schedule a refresh once the batch is full."""
+        if not content.strip():
+            return
+        self.usernames[user_id] = username
+        buffer = self.pending.setdefault(user_id, [])
+        buffer.append(content)
+        if len(buffer) >= PERSONA_REFRESH_BATCH and user_id not in self.refreshing:
+            task = asyncio.create_task(self.flush(user_id))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def flush(self, user_id: str):
+        """Fold the buffered messages for a user into their digest."""
+        messages = self.pending.pop(user_id, [])
+        if not messages:
+            return
+        self.refreshing.add(user_id)
+        try:
+            await self.refresh(user_id, self.usernames.get(user_id, "Unknown User"), messages)
+        except Exception as e:
+            logging.error(f"Error refreshing persona digest: {str(e)}")
+        finally:
+            self.refreshing.discard(user_id)
+
+    async def refresh(self, user_id: str, username: str, messages: List[str]) -> PersonaDigest:
+        """Merge messages into the stored digest (or create it) and persist the result."""
+        current = await asyncio.to_thread(self.store.get, user_id)
+        current_profile = json.dumps({
+            "style": current.style,
+            "topics": current.topics,
+            "representative_messages": current.examples
+        }) if current else "None yet"
+        new_messages = truncate_to_tokens("\n".join(f"- {msg}" for msg in messages), MAX_CONTEXT_TOKENS)
+
+        completion = await self.client.complete(
+            "persona_digest",
+            messages=[
+                {
+                    "role": "system",
+                    "content": f"You maintain a profile of how a chat user writes. Update the current profile with the new messages. Respond in JSON format with keys: style (a specific description of tone, vocabulary, common phrases and patterns), topics (list of up to 8 short topics they often discuss), representative_messages (list of up to {PERSONA_MAX_EXAMPLES} messages copied verbatim that best show their voice)."
+                },
+                {"role": "user", "content": f"Current profile:\n{current_profile}\n\nNew messages:\n{new_messages}"}
+            ],
+            temperature=0.3,
+            max_tokens=700,
+            response_format={"type": "json_object"}
+        )
+        profile = json.loads(completion.choices[0].message.content)
+
+        digest = PersonaDigest(
+            user_id=user_id,
+            username=username,
+            style=profile.get("style") or (current.style if current else ""),
+            topics=[str(topic) for topic in profile.get("topics", [])][:8],
+            examples=[str(example)[:MAX_EXAMPLE_CHARS] for example in profile.get("representative_messages", [])][:PERSONA_MAX_EXAMPLES],
+            message_count=(current.message_count if current else 0) + len(messages),
+            updated_at=time.time()
+        )
+        embedding = await self.embeddings.aembed_query(f"{digest.style}\n{', '.join(digest.topics)}")
+        await asyncio.to_thread(self.store.put, digest, embedding)
+        return digest
@@ -0,0 +1,58 @@
+from functools import lru_cache
+from typing import List
+import tiktoken
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from constants import MODEL_NAME, DOCUMENT_CHUNK_TOKENS, DOCUMENT_CHUNK_OVERLAP_TOKENS
+
+FALLBACK_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model: str = MODEL_NAME) -> tiktoken.Encoding:
+    """Return the process-wide encoder for a model (loaded once)."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+
+
+def count_tokens(text: str, model: str = MODEL_NAME) -> int:
+    """Count the tokens in a string."""
+    if not text:
+        return 0
+    return len(get_encoder(model).encode_ordinary(text))
+
+
+def count_tokens_batch(texts: List[str], model: str = MODEL_NAME) -> List[int]:
+    """Count tokens for many strings with one batched (multi-threaded) encode."""
+    if not texts:
+        return []
+    return [len(tokens) for tokens in get_encoder(model).encode_ordinary_batch(texts)]
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = MODEL_NAME) -> str:
+    """Cut a string down to at most max_tokens tokens."""
+    encoder = get_encoder(model)
+    tokens = encoder.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoder.decode(tokens[:max_tokens])
+
+
+def split_by_tokens(text: str, max_tokens: int, model: str = MODEL_NAME) -> List[str]:
+    """Split a string into consecutive slices of at most max_tokens tokens."""
+    encoder = get_encoder(model)
+    tokens = encoder.encode_ordinary(text)
+    return [encoder.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def token_text_splitter(
+    chunk_size: int = DOCUMENT_CHUNK_TOKENS,
+    chunk_overlap: int = DOCUMENT_CHUNK_OVERLAP_TOKENS
+) -> RecursiveCharacterTextSplitter:
+    """Recursive splitter whose chunk size and overlap are measured in tokens."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=count_tokens
+    )
@@ -0,0 +1,108 @@
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+import httpx
+from constants import TWILIO_API_BASE_URL, TWILIO_TIMEOUT, TWILIO_CONNECT_TIMEOUT, TWILIO_MAX_CONNECTIONS
+
+API_VERSION = "2010-04-01"
+
+
+class TwilioAPIError(Exception):
+    def __init__(self, operation: str, status_code: int, message: str):
+        super().__init__(f"Twilio {operation} failed ({status_code}): {message}")
+        self.status_code = status_code
+
+
+class OperationMetrics:
+    """Latency and error counts of one Twilio operation."""
+
+    def __init__(self, window: int = 200):
+        self.calls = 0
+        self.errors = 0
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_seconds": round(ordered[len(ordered) // 2], 3) if ordered else None,
+            "p95_seconds": round(ordered[int(len(ordered) * 0.95)], 3) if ordered else None
+        }
+
+
+class TwilioREST:
+    """Async client for the few Twilio REST endpoints the phone router uses.
+
+    Requests share one pooled httpx connection pool with per-request
+    timeouts, so they never block the event loop. base_url can point at a
+    local stand-in for the Twilio API in tests.
+    """
+
+    def __init__(
+        self,
+        account_sid: str,
+        auth_token: str,
+        base_url: str = TWILIO_API_BASE_URL,
+        timeout: float = TWILIO_TIMEOUT,
+        max_connections: int = TWILIO_MAX_CONNECTIONS
+    ):
+        self.account_sid = account_sid
+        self.base_url = base_url.rstrip("/")
+        self.client = httpx.AsyncClient(
+            base_url=f"{self.base_url}/{API_VERSION}/Accounts/{account_sid}",
+            auth=(account_sid or "", auth_token or ""),
+            timeout=httpx.Timeout(timeout, connect=TWILIO_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        self.operations: Dict[str, OperationMetrics] = {}
+
+    async def _request(self, operation: str, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        metrics = self.operations.setdefault(operation, OperationMetrics())
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            if response.status_code >= 400:
+                try:
+                    message = response.json().get("message", response.text)
+                except ValueError:
+                    message = response.text
+                raise TwilioAPIError(operation, response.status_code, message)
+            return response.json()
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            metrics.calls += 1
+            metrics.latencies.append(time.perf_counter() - started)
+
+    async def create_call(
+        self,
+        to: str,
+        from_: str,
+        twiml: str,
+        record: bool = False,
+        status_callback: Optional[str] = None,
+        status_callback_events: Optional[List[str]] = None,
+        recording_status_callback: Optional[str] = None
+    ) -> Dict[str, Any]:
+        data = {"To": to, "From": from_, "Twiml": twiml, "Record": str(record).lower()}
+        if status_callback:
+            data["StatusCallback"] = status_callback
+            data["StatusCallbackEvent"] = status_callback_events or []
+        if recording_status_callback:
+            data["RecordingStatusCallback"] = recording_status_callback
+        return await self._request("create_call", "POST", "/Calls.json", data=data)
+
+    async def fetch_call(self, call_sid: str) -> Dict[str, Any]:
+        return await self._request("fetch_call", "GET", f"/Calls/{call_sid}.json")
+
+    async def list_recordings(self, call_sid: str) -> List[Dict[str, Any]]:
+        response = await self._request("list_recordings", "GET", "/Recordings.json", params={"CallSid": call_sid})
+        return response.get("recordings", [])
+
+    async def close(self):
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {operation: metrics.stats() for operation, metrics in self.operations.items()}
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+import numpy as np
+from pydantic import BaseModel
+from constants import (
+    VOICE_SESSION_TTL,
+    VOICE_SESSION_SIZE,
+    VOICE_SESSION_TURNS,
+    VOICE_DRIFT_THRESHOLD,
+    VOICE_WARM_WAIT
+)
+from models import Message
+from services.persona_digests import PersonaDigestStore
+
+Retriever = Callable[[str, str, str], Awaitable[List[Message]]]  # (query, channel_id, user_id) -> context
+
+
+class VoiceSession(BaseModel):
+    call_sid: str
+    channel_id: str
+    user_id: str
+    topic: str  # What the context was retrieved for: the call script, then the latest drifted turn
+    topic_embedding: Optional[List[float]] = None
+    context: List[Message] = []
+    persona: str = ""  # Style and topics of the user the call is made for
+    turns: List[Dict[str, str]] = []  # Recent exchanges, oldest first
+    updated_at: float = 0
+
+
+class VoiceSessionManager:
+    """Per-call context for /phone/transcribe, keyed by CallSid.
+
+    A session is warmed in the background when the call is placed, with the
+    context retrieved for the call script and the user's persona digest, so
+    speech turns only pay for one embedding and the reply. A turn whose
+    embedding drifts below VOICE_DRIFT_THRESHOLD from the session topic is
+    still answered from the current context while a refresh runs for the
+    turns after it.
+    """
+
+    def __init__(
+        self,
+        retrieve: Retriever,
+        embeddings,
+        personas: PersonaDigestStore,
+        max_sessions: int = VOICE_SESSION_SIZE,
+        ttl: float = VOICE_SESSION_TTL
+    ):
+        self.retrieve = retrieve
+        self.embeddings = embeddings
+        self.personas = personas
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.sessions: "OrderedDict[str, VoiceSession]" = OrderedDict()
+        self.warming: Dict[str, asyncio.Task] = {}
+        self.refreshing: Set[str] = set()
+        self.tasks: Set[asyncio.Task] = set()  # Background refreshes, kept alive until they finish
+
+    def start(self, call_sid: str, channel_id: str, user_id: str, topic: str):
+        """Begin warming the session of a call that was just placed."""
+        task = asyncio.create_task(self.warm(call_sid, channel_id, user_id, topic))
+        self.warming[call_sid] = task
+        task.add_done_callback(lambda _: self.warming.pop(call_sid, None))
+
+    async def warm(self, call_sid: str, channel_id: str, user_id: str, topic: str) -> Optional[VoiceSession]:
+        try:
+            context, topic_embedding, digest = await asyncio.gather(
+                self.retrieve(topic, channel_id, user_id),
+                self.embeddings.aembed_query(topic),
+                asyncio.to_thread(self.personas.get, user_id)
+            )
+        except Exception as e:
+            logging.error(f"Error warming voice session: {str(e)}")
+            return None
+        persona = f"{digest.username}: {digest.style}\nOften talks about: {', '.join(digest.topics)}" if digest else ""
+        session = VoiceSession(
+            call_sid=call_sid,
+            channel_id=channel_id,
+            user_id=user_id,
+            topic=topic,
+            topic_embedding=topic_embedding,
+            context=context,
+            persona=persona
+        )
+        self.put(session)
+        return session
+
+    def put(self, session: VoiceSession):
+        session.updated_at = time.time()
+        self.sessions[session.call_sid] = session
+        self.sessions.move_to_end(session.call_sid)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+
+    def get(self, call_sid: str) -> Optional[VoiceSession]:
+        session = self.sessions.get(call_sid)
+        if session and time.time() - session.updated_at > self.ttl:
+            del self.sessions[call_sid]
+            return None
+        return session
+
+    async def session_for_turn(self, call_sid: str, speech: str) -> Optional[VoiceSession]:
+        """The session to answer a speech turn from, refreshing it in the background if the turn drifted."""
+        warming = self.warming.get(call_sid)
+        if warming is not None:
+            # The callee picked up before warming finished; wait briefly rather than retrieve twice
+            await asyncio.wait({warming}, timeout=VOICE_WARM_WAIT)
+        session = self.get(call_sid)
+        if session is None:
+            return None
+
+        embedding = await self.embeddings.aembed_query(speech)
+        if session.topic_embedding and call_sid not in self.refreshing:
+            current = np.asarray(embedding, dtype=np.float32)
+            topic = np.asarray(session.topic_embedding, dtype=np.float32)
+            similarity = float(current @ topic / ((np.linalg.norm(current) * np.linalg.norm(topic)) or 1.0))
+            if similarity < VOICE_DRIFT_THRESHOLD:
+                task = asyncio.create_task(self.refresh(session, speech, embedding))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        return session
+
+    async def refresh(self, session: VoiceSession, speech: str, embedding: List[float]):
+        """Retrieve context for the turn the conversation drifted to."""
+        self.refreshing.add(session.call_sid)
+        try:
+            session.context = await self.retrieve(speech, session.channel_id, session.user_id)
+            session.topic = speech
+            session.topic_embedding = embedding
+        except Exception as e:
+            logging.error(f"Error refreshing voice session: {str(e)}")
+        finally:
+            self.refreshing.discard(session.call_sid)
+
+    def add_turn(self, session: VoiceSession, speech: str, reply: str):
+        session.turns.append({"role": "user", "content": speech})
+        session.turns.append({"role": "assistant", "content": reply})
+        session.turns = session.turns[-2 * VOICE_SESSION_TURNS:]
+        self.put(session)
+
+    def end(self, call_sid: str):
+        """Forget a finished call."""
+        self.sessions.pop(call_sid, None)
+        warming = self.warming.pop(call_sid, None)
+        if warming is not None:
+            warming.cancel()